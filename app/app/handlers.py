@@ -0,0 +1,137 @@
+"""
+Request handlers running token authenticated API calls through a lean
+middleware chain
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import Resolver404, resolve
+from django.utils.module_loading import import_string
+
+
+class APIHandler(BaseHandler):
+    """Handler whose middleware chain is built from `middleware` paths"""
+
+    def __init__(self, middleware):
+        super().__init__()
+        self.middleware = middleware
+
+    def load_middleware(self, is_async=False):
+        """BaseHandler.load_middleware over self.middleware.
+
+        Mirrors Django's loop rather than swapping settings.MIDDLEWARE,
+        which other code may read at the same time. The loop follows
+        Django 3.2's private internals, which is why requirements.txt pins
+        Django to 3.2.x; re-check it against BaseHandler when upgrading.
+        """
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        handler_is_async = is_async
+        for middleware_path in reversed(self.middleware):
+            middleware = import_string(middleware_path)
+            middleware_can_sync = getattr(middleware, "sync_capable", True)
+            middleware_can_async = getattr(middleware, "async_capable", False)
+            if not middleware_can_sync and not middleware_can_async:
+                raise RuntimeError(
+                    f"Middleware {middleware_path} must have at least one of "
+                    "sync_capable/async_capable set to True."
+                )
+            elif not handler_is_async and middleware_can_sync:
+                middleware_is_async = False
+            else:
+                middleware_is_async = middleware_can_async
+            try:
+                adapted_handler = self.adapt_method_mode(
+                    middleware_is_async,
+                    handler,
+                    handler_is_async,
+                    debug=settings.DEBUG,
+                    name=f"middleware {middleware_path}",
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed:
+                continue
+            handler = adapted_handler
+            if mw_instance is None:
+                raise ImproperlyConfigured(
+                    f"Middleware factory {middleware_path} returned None."
+                )
+
+            if hasattr(mw_instance, "process_view"):
+                self._view_middleware.insert(
+                    0,
+                    self.adapt_method_mode(is_async, mw_instance.process_view),
+                )
+            if hasattr(mw_instance, "process_template_response"):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(
+                        is_async,
+                        mw_instance.process_template_response,
+                    ),
+                )
+            if hasattr(mw_instance, "process_exception"):
+                # exception middleware is always run synchronously
+                self._exception_middleware.append(
+                    self.adapt_method_mode(False, mw_instance.process_exception),
+                )
+
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+
+        handler = self.adapt_method_mode(is_async, handler, handler_is_async)
+        self._middleware_chain = handler
+
+    def resolve_request(self, request):
+        # already resolved by is_lean_api_request
+        return request.resolver_match
+
+
+def is_lean_api_request(request):
+    """Whether `request` can skip session, CSRF, auth and messages.
+
+    True for DRF views under API_PREFIX called with an
+    `Authorization: Token` header and no session cookie. DRF sets
+    request.user itself; browsers (Swagger UI, the login and register
+    pages) send the session cookie and keep the full chain.
+    """
+    if not settings.LEAN_API_MIDDLEWARE:
+        return False
+    if not request.path_info.startswith(settings.API_PREFIX):
+        return False
+    if request.META.get("HTTP_AUTHORIZATION", "")[:6].lower() != "token ":
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    if not hasattr(match.func, "cls"):
+        return False
+    request.resolver_match = match
+    return True
+
+
+class LeanAPIHandlerMixin:
+    """Dispatch lean API requests to an APIHandler, the rest as usual"""
+
+    def load_middleware(self, is_async=False):
+        super().load_middleware(is_async)
+        self.api_handler = APIHandler(settings.API_MIDDLEWARE)
+        self.api_handler.load_middleware(is_async)
+
+    def get_response(self, request):
+        if is_lean_api_request(request):
+            return self.api_handler.get_response(request)
+        return super().get_response(request)
+
+
+class LeanAPIWSGIHandler(LeanAPIHandlerMixin, WSGIHandler):
+    pass
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # user defined
     "core",
     "user",
@@ -61,6 +62,23 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Calls to DRF views under API_PREFIX with a Token header and no session
+# cookie only run API_MIDDLEWARE (see app.handlers): MIDDLEWARE without
+# the session, CSRF, auth, messages and frame options entries they have
+# no use for. Anything else added to MIDDLEWARE (CORS, ...) is kept.
+LEAN_API_MIDDLEWARE = bool(int(os.environ.get("LEAN_API_MIDDLEWARE", 1)))
+API_PREFIX = "/api/"
+API_SKIPPED_MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+API_MIDDLEWARE = [
+    path for path in MIDDLEWARE if path not in API_SKIPPED_MIDDLEWARE
+]
+
 ROOT_URLCONF = "app.urls"
 
 TEMPLATES = [
@@ -133,10 +151,18 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = "/static/static/"
-MEDIA_URL = "/static/media/"
+MEDIA_URL = "/media/"
 
 STATIC_ROOT = "/vol/web/static"
 MEDIA_ROOT = "/vol/web/media"
+
+# Media is served by recipe.views.RecipeMediaView after an ownership check.
+# With MEDIA_ACCEL_REDIRECT nginx sends the file from this internal
+# location; without it (the DEBUG default) Django streams the file itself.
+MEDIA_ACCEL_REDIRECT = bool(
+    int(os.environ.get("MEDIA_ACCEL_REDIRECT", 0 if DEBUG else 1))
+)
+MEDIA_ACCEL_REDIRECT_URL = "/protected-media/"
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -148,7 +174,7 @@ AUTH_USER_MODEL = "core.User"
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "user.authentication.CachedTokenAuthentication",
     ],  # noqa
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -161,3 +187,66 @@ SPECTACULAR_SETTINGS = {
         "withCredentials": True,  # Allows sending session cookies
     },
 }
+
+
+# Recipe list pagination
+RECIPE_PAGE_SIZE = int(os.environ.get("RECIPE_PAGE_SIZE", 100))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get("RECIPE_MAX_PAGE_SIZE", 1000))
+RECIPE_BATCH_MAX_OPERATIONS = int(
+    os.environ.get("RECIPE_BATCH_MAX_OPERATIONS", 500)
+)
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get("RECIPE_EXPORT_CHUNK_SIZE", 500))
+
+# Recipe image uploads are refused above these limits, checked while the
+# upload streams in and from the image header before anything is decoded
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.environ.get("RECIPE_IMAGE_MAX_BYTES", 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.environ.get("RECIPE_IMAGE_MAX_PIXELS", 50_000_000)
+)
+
+# Worker processes (per web worker) rendering resized recipe images;
+# 0 renders them inline once the upload commits
+RECIPE_THUMBNAIL_WORKERS = int(os.environ.get("RECIPE_THUMBNAIL_WORKERS", 2))
+
+# Tag/ingredient autocomplete
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Per-user versioned response cache for recipe/tag/ingredient reads.
+# uWSGI runs several workers, so the default backend must be shared
+# between processes; locmem is only suitable for single process setups.
+API_CACHE_ALIAS = "api"
+API_CACHE_TIMEOUT = int(os.environ.get("API_CACHE_TIMEOUT", 300))
+
+# Token -> user lookups of CachedTokenAuthentication. Needs a backend
+# shared by all workers, so evictions on logout, token deletion and user
+# changes reach every process.
+AUTH_TOKEN_CACHE_ALIAS = os.environ.get("AUTH_TOKEN_CACHE_ALIAS", API_CACHE_ALIAS)
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get("AUTH_TOKEN_CACHE_TIMEOUT", 300))
+
+API_CACHE_BACKEND = os.environ.get(
+    "API_CACHE_BACKEND",
+    "django.core.cache.backends.filebased.FileBasedCache",
+)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    API_CACHE_ALIAS: {
+        "BACKEND": API_CACHE_BACKEND,
+        "LOCATION": os.environ.get("API_CACHE_LOCATION", "/vol/cache/api"),
+    },
+}
+
+if API_CACHE_BACKEND.endswith(".FileBasedCache"):
+    # Django's default of 300 entries is soon reached by responses, user
+    # versions and tokens together, after which sets keep dropping files
+    # at random. Every set also lists the directory, so this backend only
+    # suits development; docker-compose-deploy.yml uses memcached.
+    CACHES[API_CACHE_ALIAS]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.environ.get("API_CACHE_MAX_ENTRIES", 20_000)),
+        "CULL_FREQUENCY": 10,
+    }
@@ -5,7 +5,7 @@ from drf_spectacular.views import (
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from recipe.views import RecipeMediaView
 from user.views import login_view
 
 urlpatterns = [
@@ -19,10 +19,9 @@ urlpatterns = [
     ),
     path("api/user/", include("user.urls")),
     path("api/recipe/", include("recipe.urls")),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}<path:name>",
+        RecipeMediaView.as_view(),
+        name="media",
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
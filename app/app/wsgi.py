@@ -2,6 +2,7 @@
 WSGI config for app project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Token authenticated API calls skip part of the middleware, see app.handlers.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
@@ -9,8 +10,11 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+import django
+
+from app.handlers import LeanAPIWSGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_wsgi_application()
+django.setup(set_prefix=False)
+application = LeanAPIWSGIHandler()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from recipe.cache import cache_metrics
+
+"""Command to report the API response cache hit rate"""
+
+
+class Command(BaseCommand):
+    """Print the hit and miss counts of the response cache.
+
+    The counters live in the shared API cache, so they cover every
+    worker since the cache was last cleared.
+    """
+
+    help = "Show API response cache hits, misses and hit rate"
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        metrics = cache_metrics()
+        total = metrics["hits"] + metrics["misses"]
+        rate = metrics["hits"] / total if total else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"hits {metrics['hits']}, misses {metrics['misses']}, "
+                f"hit rate {rate:.1%}"
+            )
+        )
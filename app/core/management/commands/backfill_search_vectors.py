@@ -0,0 +1,43 @@
+from django.contrib.postgres.search import SearchVector
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from core.models import Recipe
+
+"""Command to fill the search vector of recipes written before it existed"""
+
+
+class Command(BaseCommand):
+    """Compute Recipe.search_vector where it is still NULL.
+
+    The trigger from migration 0012 maintains the vector of every recipe
+    written since; this fills older rows one id range at a time, each
+    range its own short UPDATE, so no statement rewrites or locks the
+    whole table. Recipes without a vector are not found by ?search=
+    until this has run.
+    """
+
+    help = "Backfill the full text search vector of existing recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive")
+        # the same expression as the trigger's
+        vector = SearchVector("title", weight="A", config="english") + (
+            SearchVector("description", weight="B", config="english")
+        )
+        pending = Recipe.objects.filter(search_vector=None)
+        bounds = pending.aggregate(low=Min("id"), high=Max("id"))
+        filled = 0
+        low = bounds["low"]
+        while low is not None and low <= bounds["high"]:
+            filled += pending.filter(
+                id__gte=low,
+                id__lt=low + batch_size,
+            ).update(search_vector=vector)
+            low += batch_size
+        self.stdout.write(self.style.SUCCESS(f"Filled {filled} search vectors"))
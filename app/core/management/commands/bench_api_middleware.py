@@ -0,0 +1,109 @@
+import io
+import time
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from app.handlers import LeanAPIWSGIHandler
+from core.models import User
+from user.authentication import evict_tokens
+
+"""Command to compare the full and the lean API middleware chains"""
+
+
+class Command(BaseCommand):
+    """Time token authenticated GETs through both middleware chains.
+
+    Each chain serves --rounds batches of --requests calls per path and
+    its fastest batch is reported. Requests go straight to the handlers'
+    get_response, so the numbers cover middleware, URL resolution and the
+    view but not the WSGI server. The user and token are created in a
+    transaction that is rolled back at the end.
+    """
+
+    help = "Benchmark API requests through the full and lean middleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument(
+            "--paths",
+            nargs="+",
+            default=["/api/user/me/", "/api/recipe/recipe/"],
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        if min(options["requests"], options["rounds"]) < 1:
+            raise CommandError("--requests and --rounds must be positive")
+        if not settings.LEAN_API_MIDDLEWARE:
+            raise CommandError("LEAN_API_MIDDLEWARE is disabled")
+        handlers = {"full": WSGIHandler(), "lean": LeanAPIWSGIHandler()}
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email="bench-middleware@example.com",
+                password="benchpassword",
+                first_name="bench",
+                last_name="middleware",
+                username="bench-middleware",
+            )
+            token = Token.objects.create(user=user)
+            try:
+                for path in options["paths"]:
+                    self._compare(
+                        handlers,
+                        path,
+                        token,
+                        options["requests"],
+                        options["rounds"],
+                    )
+            finally:
+                evict_tokens([token.key])
+                transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _compare(self, handlers, path, token, count, rounds):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": "",
+            "SERVER_NAME": settings.ALLOWED_HOSTS[0],
+            "SERVER_PORT": "443",
+            "HTTP_HOST": settings.ALLOWED_HOSTS[0],
+            "HTTP_ACCEPT": "application/json",
+            "HTTP_AUTHORIZATION": f"Token {token.key}",
+            "wsgi.url_scheme": "https",
+        }
+        for name, handler in handlers.items():
+            # warm caches (token lookup, cached responses) before timing
+            status_code = self._request(handler, environ).status_code
+            with CaptureQueriesContext(connection) as queries:
+                self._request(handler, environ)
+            self.stdout.write(
+                f"{path} {name:>4}: {len(queries)} queries, status {status_code}"
+            )
+        # alternate the chains and keep each one's best round, so load
+        # from other processes does not decide the comparison
+        timings = dict.fromkeys(handlers, float("inf"))
+        for _ in range(rounds):
+            for name, handler in handlers.items():
+                started = time.perf_counter()
+                for _ in range(count):
+                    self._request(handler, environ)
+                elapsed = (time.perf_counter() - started) / count
+                timings[name] = min(timings[name], elapsed)
+        for name, elapsed in timings.items():
+            self.stdout.write(f"{path} {name:>4}: {elapsed * 1e6:8.1f}us/request")
+        saved = timings["full"] - timings["lean"]
+        self.stdout.write(
+            f"{path} saved {saved * 1e6:.1f}us/request "
+            f"({saved / timings['full']:.0%})"
+        )
+
+    def _request(self, handler, environ):
+        return handler.get_response(
+            WSGIRequest(dict(environ, **{"wsgi.input": io.BytesIO()}))
+        )
@@ -0,0 +1,137 @@
+import random
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from core.models import User, Recipe, Tag, Ingredient
+
+"""Command to compare recipe query plans with and without access path indexes"""
+
+ACCESS_PATH_DROPS = [
+    "DROP INDEX recipe_user_id_desc_idx",
+    "DROP INDEX recipe_tags_tag_recipe_idx",
+    "DROP INDEX recipe_ingredients_ing_recipe_idx",
+    "ALTER TABLE core_tag DROP CONSTRAINT unique_tag_name_per_user",
+    "ALTER TABLE core_ingredient "
+    "DROP CONSTRAINT unique_ingredient_name_per_user",
+]
+
+
+class Command(BaseCommand):
+    """Seed a throwaway dataset and EXPLAIN the recipe API access paths.
+
+    Everything runs in one transaction that is rolled back at the end, so
+    the command is safe to point at a development database.
+    """
+
+    help = "EXPLAIN recipe API queries with and without the access path indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=2000,
+            help="recipes per user",
+        )
+        parser.add_argument(
+            "--names",
+            type=int,
+            default=200,
+            help="tags and ingredients per user",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            users = self._seed(rng, options)
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                cursor.execute("ANALYZE")
+            self._report("With access path indexes", users[0])
+            with connection.cursor() as cursor:
+                for statement in ACCESS_PATH_DROPS:
+                    cursor.execute(statement)
+                cursor.execute("ANALYZE")
+            self._report("Without access path indexes", users[0])
+            transaction.set_rollback(True)
+
+    def _seed(self, rng, options):
+        """Bulk insert users, recipes, names and links"""
+        self.stdout.write("Seeding dataset....")
+        users = User.objects.bulk_create(
+            [
+                User(
+                    email=f"bench{i}@example.com",
+                    username=f"bench{i}",
+                    first_name="bench",
+                    last_name="bench",
+                )
+                for i in range(options["users"])
+            ]
+        )
+        for user in users:
+            recipes = Recipe.objects.bulk_create(
+                [
+                    Recipe(user=user, title=f"recipe {i}")
+                    for i in range(options["recipes"])
+                ],
+                batch_size=5000,
+            )
+            for model, field in ((Tag, "tags"), (Ingredient, "ingredients")):
+                names = model.objects.bulk_create(
+                    [
+                        model(user=user, name=f"{field} {i}")
+                        for i in range(options["names"])
+                    ]
+                )
+                through = getattr(Recipe, field).through
+                fk = f"{model._meta.model_name}_id"
+                links = []
+                for recipe in recipes:
+                    picks = rng.sample(names, min(3, len(names)))
+                    links.extend(
+                        through(recipe_id=recipe.id, **{fk: obj.id})
+                        for obj in picks
+                    )
+                through.objects.bulk_create(links, batch_size=5000)
+        return users
+
+    def _report(self, heading, user):
+        """Print EXPLAIN ANALYZE output for each access path"""
+        self.stdout.write(self.style.SUCCESS(f"== {heading} =="))
+        tag_ids = list(
+            Tag.objects.filter(user=user).values_list("id", flat=True)[:3]
+        )
+        access_paths = [
+            (
+                "recipe list",
+                Recipe.objects.filter(user=user).order_by("-id")[:100],
+            ),
+            (
+                "recipe list filtered by tags",
+                Recipe.objects.filter(
+                    Exists(
+                        Recipe.tags.through.objects.filter(
+                            recipe_id=OuterRef("pk"),
+                            tag_id__in=tag_ids,
+                        )
+                    ),
+                    user=user,
+                ).order_by("-id")[:100],
+            ),
+            (
+                "tag list",
+                Tag.objects.filter(user=user).order_by("-name"),
+            ),
+            (
+                "ingredient list",
+                Ingredient.objects.filter(user=user).order_by("-name"),
+            ),
+        ]
+        for label, queryset in access_paths:
+            plan = queryset.explain(analyze=True)
+            sorts = plan.count("Sort  (")
+            self.stdout.write(f"-- {label} (sort nodes: {sorts})")
+            self.stdout.write(plan)
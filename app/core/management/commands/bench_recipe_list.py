@@ -0,0 +1,138 @@
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from core.models import User, Recipe, Tag, Ingredient
+from recipe.documents import document_list_rows
+from recipe.readers import (
+    nested_prefetches,
+    recipe_list_rows,
+    recipe_list_values,
+)
+from recipe.renderers import FastJSONRenderer
+from recipe.serializers import RecipeSerializer
+
+"""Command to compare the recipe list read paths"""
+
+
+class Command(BaseCommand):
+    """Seed a throwaway dataset and time both list read paths.
+
+    Compares RecipeSerializer, values() rows and stored RecipeDocuments.
+    Each size is rendered as one unpaginated payload so the numbers show
+    the cost of building and encoding the body. Everything runs in one
+    transaction that is rolled back at the end.
+    """
+
+    help = "Benchmark the serializer, values() and document list paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 10000],
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        with transaction.atomic():
+            user = self._seed(max(options["sizes"]))
+            recipes = (
+                Recipe.objects.filter(user=user)
+                .defer("search_vector")
+                .order_by("-id")
+            )
+            for size in options["sizes"]:
+                serializer_time, serializer_body = self._time(
+                    options["repeat"],
+                    lambda: self._serializer_path(recipes[:size]),
+                )
+                values_time, values_body = self._time(
+                    options["repeat"],
+                    lambda: self._values_path(recipes[:size]),
+                )
+                documents_time, documents_body = self._time(
+                    options["repeat"],
+                    lambda: self._documents_path(recipes[:size]),
+                )
+                identical = (
+                    "yes"
+                    if serializer_body == values_body == documents_body
+                    else "NO"
+                )
+                self.stdout.write(
+                    f"{size:>6} recipes: "
+                    f"serializer {serializer_time * 1000:8.1f}ms  "
+                    f"values {values_time * 1000:8.1f}ms  "
+                    f"({serializer_time / values_time:.1f}x)  "
+                    f"documents {documents_time * 1000:8.1f}ms  "
+                    f"({serializer_time / documents_time:.1f}x)  "
+                    f"identical output: {identical}"
+                )
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _seed(self, count):
+        """Bulk insert one user with `count` recipes and linked names"""
+        self.stdout.write("Seeding dataset....")
+        user = User.objects.create(
+            email="bench-list@example.com",
+            username="bench-list",
+            first_name="bench",
+            last_name="bench",
+        )
+        recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    user=user,
+                    title=f"recipe {i}",
+                    time_minutes=i % 90,
+                    price=Decimal(i % 5000) / 100,
+                    link=f"https://example.com/{i}",
+                )
+                for i in range(count)
+            ],
+            batch_size=5000,
+        )
+        for model, field in ((Tag, "tags"), (Ingredient, "ingredients")):
+            names = model.objects.bulk_create(
+                [model(user=user, name=f"{field} {i}") for i in range(50)]
+            )
+            through = getattr(Recipe, field).through
+            fk = f"{model._meta.model_name}_id"
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe.id, **{fk: names[(i + j) % 50].id})
+                    for i, recipe in enumerate(recipes)
+                    for j in range(3)
+                ],
+                batch_size=5000,
+            )
+        return user
+
+    def _time(self, repeat, path):
+        """Return the best wall time of `repeat` runs and the last body"""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = path()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
+
+    def _serializer_path(self, queryset):
+        recipes = queryset.prefetch_related(*nested_prefetches())
+        data = RecipeSerializer(recipes, many=True).data
+        return JSONRenderer().render(data)
+
+    def _values_path(self, queryset):
+        rows = list(recipe_list_values(queryset))
+        return FastJSONRenderer().render(recipe_list_rows(rows))
+
+    def _documents_path(self, queryset):
+        rows = list(queryset.values("id", "document__data"))
+        data = document_list_rows(rows, RecipeSerializer.Meta.fields)
+        return FastJSONRenderer().render(data)
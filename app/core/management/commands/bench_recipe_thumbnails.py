@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from recipe.thumbnails import render_variants
+
+"""Command to measure the image variant pipeline throughput"""
+
+
+class Command(BaseCommand):
+    """Render variants of synthetic photos with different pool sizes.
+
+    `--workers 0` renders inline in this process; any other value uses a
+    process pool of that size, started and warmed up before timing. Files
+    are written to a temporary directory that is removed afterwards.
+    """
+
+    help = "Benchmark resized recipe image rendering"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=24)
+        parser.add_argument("--width", type=int, default=3024)
+        parser.add_argument("--height", type=int, default=4032)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            default=[0, 1, 2, 4],
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        if options["images"] < 1 or min(options["workers"]) < 0:
+            raise CommandError("Need at least one image and workers >= 0")
+        directory = tempfile.mkdtemp(prefix="bench-thumbnails-")
+        try:
+            sources = self._seed(
+                directory,
+                options["images"],
+                (options["width"], options["height"]),
+            )
+            source_bytes = sum(os.path.getsize(path) for path in sources)
+            self.stdout.write(
+                f"{len(sources)} images of {options['width']}x"
+                f"{options['height']}, "
+                f"{source_bytes / len(sources) / 1024:.0f}KB each"
+            )
+            for workers in options["workers"]:
+                elapsed, output_bytes = self._run(directory, sources, workers)
+                self.stdout.write(
+                    f"workers {workers:>2}: "
+                    f"{len(sources) / elapsed:7.2f} images/s  "
+                    f"{elapsed * 1000 / len(sources):8.1f}ms/image  "
+                    f"variants {output_bytes / len(sources) / 1024:6.0f}KB"
+                    "/image"
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _seed(self, directory, count, size):
+        """Write `count` noisy JPEGs shaped like rotated phone photos"""
+        self.stdout.write("Generating images....")
+        noise = Image.effect_noise(size, 64).convert("RGB")
+        gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+        photo = Image.blend(noise, gradient, 0.5)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90 degrees on display
+        sources = []
+        for i in range(count):
+            path = os.path.join(directory, f"source-{i}.jpg")
+            photo.save(path, "JPEG", quality=90, exif=exif.tobytes())
+            sources.append(path)
+        return sources
+
+    def _run(self, directory, sources, workers):
+        """Render every source, returning wall time and bytes written"""
+        target = os.path.join(directory, f"variants-{workers}")
+        os.makedirs(target)
+        stems = [f"image-{i}" for i in range(len(sources))]
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # start every worker before the clock starts
+                list(pool.map(_noop, range(workers)))
+                started = time.perf_counter()
+                list(
+                    pool.map(
+                        render_variants,
+                        sources,
+                        [target] * len(sources),
+                        stems,
+                    )
+                )
+                elapsed = time.perf_counter() - started
+        else:
+            started = time.perf_counter()
+            for source, stem in zip(sources, stems):
+                render_variants(source, target, stem)
+            elapsed = time.perf_counter() - started
+        output_bytes = sum(
+            os.path.getsize(os.path.join(target, name))
+            for name in os.listdir(target)
+        )
+        return elapsed, output_bytes
+
+
+def _noop(value):
+    return value
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Recipe
+from recipe.documents import find_drift, refresh_documents
+
+"""Custom command to detect drift between recipes and their documents"""
+
+
+class Command(BaseCommand):
+    """Django command comparing every RecipeDocument with the serializer.
+
+    Lists each recipe whose document is missing, stale or owned by the
+    wrong user and fails unless `--fix` is given, in which case the
+    drifted documents are rebuilt.
+    """
+
+    help = "Check RecipeDocument rows against RecipeDetailSerializer output"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", help="only check this user's recipes")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="rebuild drifted documents",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        recipes = Recipe.objects.all()
+        if options["email"]:
+            try:
+                user = get_user_model().objects.get(email=options["email"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['email']}")
+            recipes = recipes.filter(user=user)
+
+        drifted = []
+        for recipe_id, reason in find_drift(recipes, options["chunk_size"]):
+            self.stdout.write(f"Recipe {recipe_id}: {reason}")
+            drifted.append(recipe_id)
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All documents in sync"))
+            return
+        if not options["fix"]:
+            raise CommandError(f"{len(drifted)} documents out of sync")
+        refresh_documents(drifted)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(drifted)} documents"))
@@ -0,0 +1,195 @@
+import os
+import posixpath
+import time
+from functools import reduce
+from operator import or_
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from core.models import ImageBlob, Recipe
+from recipe.blobs import BLOB_DIR, source_key
+
+"""Command to delete recipe image files no recipe refers to"""
+
+# suffix of a file set aside right before it is deleted, see source_key
+ASIDE_SUFFIX = ".gc"
+
+
+class Command(BaseCommand):
+    """Delete files under MEDIA_ROOT/uploads/recipe that no recipe uses.
+
+    Files come from a sorted, depth first directory walk and are checked
+    in batches with one query on the recipe_image_idx index each; a
+    variant lives as long as the image it was rendered from. Files
+    modified within --min-age seconds are never deleted: that covers
+    uploads whose recipe is not committed yet and blobs being reused,
+    which store_image touches. A file is renamed aside and its mtime
+    checked again before it is unlinked, so a reuse racing the collector
+    either restores it or writes it anew.
+
+    --limit and --rate bound the work of a run. With --checkpoint the
+    walk resumes after the last checked file and starts over once the
+    whole tree has been covered.
+    """
+
+    help = "Delete recipe images and variants no recipe references"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="seconds a file must be unmodified to be deleted",
+        )
+        parser.add_argument("--limit", type=int, help="files to check")
+        parser.add_argument("--rate", type=float, help="deletions per second")
+        parser.add_argument(
+            "--checkpoint",
+            help="file storing the last checked name, enables resuming",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        if min(
+            options["batch_size"],
+            options["rate"] or 1,
+            options["limit"] or 1,
+        ) <= 0:
+            raise CommandError("--batch-size, --rate and --limit must be positive")
+        self.options = options
+        self.deleted = self.freed = 0
+        self.next_delete = time.monotonic()
+        storage = Recipe._meta.get_field("image").storage
+        start_after = self._read_checkpoint(options["checkpoint"])
+        if start_after:
+            self.stdout.write(f"Resuming after {start_after}")
+
+        checked = 0
+        finished = True
+        last = None
+        batch = []
+        cutoff = time.time() - options["min_age"]
+        for name, path, mtime in self._walk(
+            storage.path(BLOB_DIR),
+            BLOB_DIR,
+            tuple(start_after.split("/")) if start_after else None,
+        ):
+            if options["limit"] is not None and checked >= options["limit"]:
+                finished = False
+                break
+            checked += 1
+            last = name
+            if mtime <= cutoff:
+                batch.append((name, path))
+            if len(batch) == options["batch_size"]:
+                self._collect(batch)
+                batch = []
+                self._commit(options["checkpoint"], last)
+        if batch:
+            self._collect(batch)
+        self._commit(options["checkpoint"], None if finished else last)
+
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {checked} files. {verb} {self.deleted} "
+                f"({self.freed / (1024 * 1024):.1f} MB)"
+            )
+        )
+
+    def _walk(self, path, name, start_after):
+        """Yield (name, path, mtime) of files below `path`, sorted.
+
+        Only one directory listing is held at a time. Names up to
+        `start_after` (split into components) are skipped, including
+        whole directories that sort before it.
+        """
+        try:
+            entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            child = posixpath.join(name, entry.name)
+            parts = tuple(child.split("/"))
+            if start_after and parts < start_after[: len(parts)]:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._walk(entry.path, child, start_after)
+            elif entry.is_file(follow_symlinks=False):
+                if start_after and parts <= start_after:
+                    continue
+                try:
+                    mtime = entry.stat(follow_symlinks=False).st_mtime
+                except FileNotFoundError:
+                    continue
+                yield child, entry.path, mtime
+
+    def _collect(self, batch):
+        """Delete the files of `batch` whose source image is unused"""
+        keys = {name: source_key(name) for name, _ in batch}
+        live = self._live_keys({key for key in keys.values() if key})
+        removed = []
+        for name, path in batch:
+            if keys[name] in live:
+                continue
+            size = self._delete(path)
+            if size is None:
+                continue
+            self.deleted += 1
+            self.freed += size
+            removed.append(name)
+            if self.options["dry_run"]:
+                self.stdout.write(f"Would delete {name}")
+        if removed and not self.options["dry_run"]:
+            ImageBlob.objects.filter(name__in=removed, ref_count=0).delete()
+
+    def _live_keys(self, keys):
+        """Source keys among `keys` that some recipe's image matches"""
+        if not keys:
+            return set()
+        images = Recipe.objects.filter(
+            reduce(or_, (Q(image__startswith=key) for key in keys))
+        ).values_list("image", flat=True)
+        return {f"{posixpath.splitext(image)[0]}." for image in images}
+
+    def _delete(self, path):
+        """Unlink `path` unless it was reused; return its size if gone"""
+        if self.options["dry_run"]:
+            try:
+                return os.stat(path).st_size
+            except FileNotFoundError:
+                return None
+        if self.options["rate"]:
+            now = time.monotonic()
+            time.sleep(max(0, self.next_delete - now))
+            interval = 1 / self.options["rate"]
+            self.next_delete = max(self.next_delete, now) + interval
+        aside = f"{path}{ASIDE_SUFFIX}"
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return None
+        stat = os.stat(aside)
+        if stat.st_mtime > time.time() - self.options["min_age"]:
+            # touched by an upload after the walk saw it; identical
+            # content if that upload has written it again meanwhile
+            os.replace(aside, path)
+            return None
+        os.remove(aside)
+        return stat.st_size
+
+    def _read_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path) as checkpoint:
+                return checkpoint.read().strip() or None
+        return None
+
+    def _commit(self, path, name):
+        """Record the last checked name, or clear it after a full pass"""
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as checkpoint:
+            checkpoint.write(name or "")
+        os.replace(tmp_path, path)
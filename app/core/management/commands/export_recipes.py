@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from recipe.export import iter_recipe_ndjson, iter_recipe_ndjson_sql
+
+"""Custom command to export a user's recipes as NDJSON"""
+
+
+class Command(BaseCommand):
+    """Django command to stream a user's recipes as NDJSON"""
+
+    help = "Export a user's recipes with tags and ingredients as NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="email of the recipe owner")
+        parser.add_argument(
+            "--after",
+            type=int,
+            help="resume after this recipe id",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--output",
+            help="file to write to, defaults to stdout",
+        )
+        parser.add_argument(
+            "--sql",
+            action="store_true",
+            help="build each line inside PostgreSQL",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+        if options["sql"]:
+            lines = iter_recipe_ndjson_sql(
+                user,
+                after=options["after"],
+                chunk_size=options["chunk_size"],
+                media_url=settings.MEDIA_URL,
+            )
+        else:
+            lines = iter_recipe_ndjson(
+                user,
+                after=options["after"],
+                chunk_size=options["chunk_size"],
+            )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        count = 0
+        with open(options["output"], "w") as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} recipes"))
@@ -0,0 +1,51 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.models import Recipe
+from recipe.thumbnails import render_variants
+from recipe.variants import render_args, store_variants
+
+"""Command to render resized variants of existing recipe images"""
+
+
+class Command(BaseCommand):
+    """Render variants for recipes whose image has none yet.
+
+    Uploads render their own variants; this backfills images stored
+    before that, or all of them with --all after changing the sizes or
+    encoder settings.
+    """
+
+    help = "Render resized variants of recipe images"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max(settings.RECIPE_THUMBNAIL_WORKERS, 1),
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        recipes = Recipe.objects.exclude(image="").exclude(image=None)
+        if not options["all"]:
+            recipes = recipes.filter(image_variants={})
+        jobs = list(recipes.order_by("id").values_list("id", "user_id", "image"))
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [
+                (job, pool.submit(render_variants, *render_args(job[2])))
+                for job in jobs
+            ]
+            for job, future in futures:
+                try:
+                    store_variants(*job, future.result())
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"Recipe {job[0]}: {exc}")
+                else:
+                    done += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered {done} images, {failed} failed")
+        )
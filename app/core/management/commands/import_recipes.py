@@ -0,0 +1,273 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_user_version
+
+"""Custom command to bulk import recipes from NDJSON or CSV"""
+
+NESTED = (("tags", Tag), ("ingredients", Ingredient))
+RECIPE_COLUMNS = ["title", "time_minutes", "price", "description", "link"]
+COPY_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+)
+INVALID_ROW_ERRORS = (
+    AttributeError,
+    CommandError,
+    InvalidOperation,
+    KeyError,
+    TypeError,
+    ValidationError,
+    ValueError,
+)
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    return str(value).translate(COPY_ESCAPES)
+
+
+class Command(BaseCommand):
+    """Django command to bulk load recipes.
+
+    NDJSON rows use the export format: title, time_minutes, price,
+    description, link and lists of {"name": ...} for tags/ingredients.
+    CSV files use the same columns with tags/ingredients as
+    `;`-separated names. Rows may carry an `email` to pick the owner,
+    otherwise `--email` is used.
+
+    Each batch commits in its own transaction: new names go in with one
+    upsert per model, recipes (with ids reserved from their sequence) and
+    links with COPY.
+    With `--checkpoint` the number of consumed input rows is stored after
+    every commit so a rerun continues where the last one stopped.
+    """
+
+    help = "Bulk import recipes from an NDJSON or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="input file, '-' for stdin")
+        parser.add_argument("--format", choices=["ndjson", "csv"])
+        parser.add_argument("--email", help="owner of rows without email")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--checkpoint",
+            help="file storing progress, enables resuming",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        self.users = {}
+        self.names = {model: {} for _, model in NESTED}
+        fmt = options["format"] or (
+            "csv" if options["path"].endswith(".csv") else "ndjson"
+        )
+        start_at = self._read_checkpoint(options["checkpoint"])
+        if start_at:
+            self.stdout.write(f"Resuming after row {start_at}")
+
+        imported = skipped = 0
+        position = start_at
+        started = time.monotonic()
+        with self._open(options["path"]) as source:
+            batch = []
+            for position, row in enumerate(self._rows(source, fmt), 1):
+                if position <= start_at:
+                    continue
+                try:
+                    batch.append(self._parse(row, options["email"]))
+                except INVALID_ROW_ERRORS as exc:
+                    skipped += 1
+                    self.stderr.write(f"Skipping row {position}: {exc}")
+                if len(batch) == options["batch_size"]:
+                    imported += self._load(batch)
+                    batch = []
+                    self._commit(options["checkpoint"], position)
+                    self._progress(imported, started)
+            if batch:
+                imported += self._load(batch)
+            self._commit(options["checkpoint"], position)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} recipes, skipped {skipped} "
+                f"in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s)"
+            )
+        )
+
+    def _open(self, path):
+        if path == "-":
+            return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+        return open(path, newline="", encoding="utf-8")
+
+    def _rows(self, source, fmt):
+        """Yield raw rows lazily from the input stream"""
+        if fmt == "csv":
+            for row in csv.DictReader(source):
+                for field, _ in NESTED:
+                    row[field] = [
+                        {"name": name.strip()}
+                        for name in (row.get(field) or "").split(";")
+                        if name.strip()
+                    ]
+                yield row
+            return
+        for line in source:
+            if line.strip():
+                yield line
+
+    def _parse(self, row, default_email):
+        """Turn a raw row into (user_id, recipe fields, nested names)"""
+        if isinstance(row, str):
+            row = json.loads(row)
+        email = row.get("email") or default_email
+        if not email:
+            raise CommandError("no email and no --email given")
+        if email not in self.users:
+            user = get_user_model().objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f"no user with email {email}")
+            self.users[email] = user.id
+        fields = {
+            "title": row.get("title") or None,
+            "time_minutes": int(row.get("time_minutes") or 0),
+            "price": Decimal(str(row.get("price") or 0)),
+            "description": row.get("description") or None,
+            "link": row.get("link") or None,
+        }
+        for name, value in fields.items():
+            # max_length / max_digits checks without a full model clean
+            fields[name] = Recipe._meta.get_field(name).clean(value, None)
+        nested = {
+            field: list(
+                dict.fromkeys(
+                    model._meta.get_field("name").clean(item["name"], None)
+                    for item in row.get(field) or []
+                )
+            )
+            for field, model in NESTED
+        }
+        return self.users[email], fields, nested
+
+    def _resolve_names(self, model, wanted):
+        """Fill the in-memory (user_id, name) -> id cache for `wanted`"""
+        cache = self.names[model]
+        missing = {key for key in wanted if key not in cache}
+        if not missing:
+            return
+        model.objects.bulk_create(
+            [model(user_id=user_id, name=name) for user_id, name in missing],
+            ignore_conflicts=True,
+        )
+        by_user = {}
+        for user_id, name in missing:
+            by_user.setdefault(user_id, []).append(name)
+        for user_id, names in by_user.items():
+            rows = model.objects.filter(user_id=user_id, name__in=names)
+            for pk, name in rows.values_list("id", "name"):
+                cache[(user_id, name)] = pk
+
+    def _load(self, batch):
+        """Insert one batch of parsed rows inside a transaction"""
+        with transaction.atomic():
+            for field, model in NESTED:
+                self._resolve_names(
+                    model,
+                    {
+                        (user_id, name)
+                        for user_id, _, nested in batch
+                        for name in nested[field]
+                    },
+                )
+            with connection.cursor() as cursor:
+                # reserve ids up front so recipes can be COPYed as well
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                    "FROM generate_series(1, %s)",
+                    [Recipe._meta.db_table, len(batch)],
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                # links go first (their FKs are checked at commit), so the
+                # RecipeDocument triggers render each recipe only once, when
+                # the recipe rows arrive
+                for field, model in NESTED:
+                    m2m = Recipe._meta.get_field(field)
+                    self._copy(
+                        cursor,
+                        m2m.m2m_db_table(),
+                        [m2m.m2m_column_name(), m2m.m2m_reverse_name()],
+                        (
+                            [pk, self.names[model][(user_id, name)]]
+                            for pk, (user_id, _, nested) in zip(ids, batch)
+                            for name in nested[field]
+                        ),
+                    )
+                now = timezone.now()
+                self._copy(
+                    cursor,
+                    Recipe._meta.db_table,
+                    [
+                        "id",
+                        "user_id",
+                        *RECIPE_COLUMNS,
+                        "image",
+                        "image_variants",
+                        "modified_at",
+                    ],
+                    (
+                        [
+                            pk,
+                            user_id,
+                            *(fields[c] for c in RECIPE_COLUMNS),
+                            "",
+                            "{}",
+                            now,
+                        ]
+                        for pk, (user_id, fields, _) in zip(ids, batch)
+                    ),
+                )
+            for user_id in {user_id for user_id, _, _ in batch}:
+                bump_user_version(user_id)
+        return len(ids)
+
+    def _copy(self, cursor, table, columns, rows):
+        """COPY `rows` into `table` using the text format"""
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(map(_copy_value, row)))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor.cursor.copy_from(buffer, table, columns=columns)
+
+    def _read_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        return 0
+
+    def _commit(self, path, position):
+        """Record the last input row whose batch has been committed"""
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as checkpoint:
+            checkpoint.write(str(position))
+        os.replace(tmp_path, path)
+
+    def _progress(self, imported, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Imported {imported} recipes "
+            f"({imported / max(elapsed, 1e-9):.0f} rows/s)"
+        )
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.models import Recipe
+from recipe.documents import refresh_documents
+
+"""Custom command to rebuild the RecipeDocument read model"""
+
+
+class Command(BaseCommand):
+    """Django command to re-render recipe documents in batches.
+
+    Documents are normally maintained by triggers; use this after
+    restoring data with triggers disabled or after changing the document
+    format. Each batch commits on its own.
+    """
+
+    help = "Rebuild RecipeDocument rows from the recipe tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", help="only rebuild this user's recipes")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """EntryPoint for Command"""
+        recipes = Recipe.objects.all()
+        if options["email"]:
+            try:
+                user = get_user_model().objects.get(email=options["email"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['email']}")
+            recipes = recipes.filter(user=user)
+
+        rebuilt = 0
+        batch = []
+        ids = recipes.order_by("id").values_list("id", flat=True)
+        for recipe_id in ids.iterator(chunk_size=options["batch_size"]):
+            batch.append(recipe_id)
+            if len(batch) == options["batch_size"]:
+                rebuilt += self._rebuild(batch)
+                batch = []
+        if batch:
+            rebuilt += self._rebuild(batch)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} documents"))
+
+    def _rebuild(self, recipe_ids):
+        with transaction.atomic():
+            refresh_documents(recipe_ids)
+        return len(recipe_ids)
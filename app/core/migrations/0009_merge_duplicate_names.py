@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:54
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Collapse duplicate (user, name) rows onto the oldest one"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = Recipe._meta.get_field(field_name).remote_field.through
+        fk = f'{model_name.lower()}_id'
+        duplicates = (
+            model.objects.values('user_id', 'name')
+            .annotate(total=Count('id'), keep_id=Min('id'))
+            .filter(total__gt=1)
+        )
+        for duplicate in duplicates:
+            extra = model.objects.filter(
+                user_id=duplicate['user_id'],
+                name=duplicate['name'],
+            ).exclude(id=duplicate['keep_id'])
+            recipe_ids = set(
+                through.objects.filter(**{f'{fk}__in': extra})
+                .values_list('recipe_id', flat=True)
+            )
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id, **{fk: duplicate['keep_id']})
+                    for recipe_id in recipe_ids
+                ],
+                ignore_conflicts=True,
+            )
+            extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
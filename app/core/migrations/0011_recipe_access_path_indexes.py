@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:56
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_unique_tag_ingredient_name'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+        ),
+        # The auto-created through tables only carry (recipe_id, x_id);
+        # filtering recipes by tag/ingredient needs the reverse direction.
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS recipe_tags_tag_recipe_idx '
+            'ON core_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS recipe_tags_tag_recipe_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS recipe_ingredients_ing_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS recipe_ingredients_ing_recipe_idx;',
+        ),
+    ]
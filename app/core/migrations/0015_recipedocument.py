@@ -0,0 +1,148 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+NESTED_SQL = """
+    {field} AS (
+        SELECT link.recipe_id,
+            jsonb_agg(jsonb_build_object('id', n.id, 'name', n.name) ORDER BY n.id)
+                AS items
+        FROM core_recipe_{field} link JOIN core_{model} n ON n.id = link.{model}_id
+        WHERE link.recipe_id = ANY(recipe_ids)
+        GROUP BY link.recipe_id
+    )
+"""
+
+# keys and formatting follow RecipeDetailSerializer; nested lists are
+# aggregated for the whole batch at once rather than per recipe
+CREATE_TRIGGERS = f"""
+CREATE FUNCTION core_recipedocument_refresh(recipe_ids bigint[]) RETURNS void AS $$
+    WITH {NESTED_SQL.format(field='tags', model='tag')},
+    {NESTED_SQL.format(field='ingredients', model='ingredient')}
+    INSERT INTO core_recipedocument (recipe_id, user_id, data)
+    SELECT r.id, r.user_id, jsonb_build_object(
+        'id', r.id,
+        'title', r.title,
+        'ingredients', COALESCE(ingredients.items, '[]'::jsonb),
+        'time_minutes', r.time_minutes,
+        'price', r.price::text,
+        'tags', COALESCE(tags.items, '[]'::jsonb),
+        'link', r.link,
+        'description', r.description,
+        'image', NULLIF(r.image, '')
+    )
+    FROM core_recipe r
+    LEFT JOIN tags ON tags.recipe_id = r.id
+    LEFT JOIN ingredients ON ingredients.recipe_id = r.id
+    WHERE r.id = ANY(recipe_ids)
+    ON CONFLICT (recipe_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, data = EXCLUDED.data;
+$$ LANGUAGE sql;
+
+CREATE FUNCTION core_recipedocument_recipes_written() RETURNS trigger AS $$
+BEGIN
+    PERFORM core_recipedocument_refresh(ARRAY(SELECT id FROM new_rows));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION core_recipedocument_recipes_deleted() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM core_recipedocument
+        WHERE recipe_id IN (SELECT id FROM old_rows);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION core_recipedocument_links_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM core_recipedocument_refresh(
+        ARRAY(SELECT DISTINCT recipe_id FROM links)
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipedocument_recipe_insert
+    AFTER INSERT ON core_recipe REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipedocument_recipes_written();
+CREATE TRIGGER core_recipedocument_recipe_update
+    AFTER UPDATE ON core_recipe REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipedocument_recipes_written();
+CREATE TRIGGER core_recipedocument_recipe_delete
+    AFTER DELETE ON core_recipe REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipedocument_recipes_deleted();
+"""
+
+for field, model in (("tags", "tag"), ("ingredients", "ingredient")):
+    CREATE_TRIGGERS += f"""
+CREATE TRIGGER core_recipedocument_{model}_link_insert
+    AFTER INSERT ON core_recipe_{field} REFERENCING NEW TABLE AS links
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipedocument_links_changed();
+CREATE TRIGGER core_recipedocument_{model}_link_delete
+    AFTER DELETE ON core_recipe_{field} REFERENCING OLD TABLE AS links
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipedocument_links_changed();
+
+CREATE FUNCTION core_recipedocument_{model}_renamed() RETURNS trigger AS $$
+BEGIN
+    PERFORM core_recipedocument_refresh(ARRAY(
+        SELECT DISTINCT link.recipe_id
+        FROM new_names n
+        JOIN old_names o ON o.id = n.id
+        JOIN core_recipe_{field} link ON link.{model}_id = n.id
+        WHERE n.name IS DISTINCT FROM o.name
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipedocument_{model}_rename
+    AFTER UPDATE ON core_{model}
+    REFERENCING OLD TABLE AS old_names NEW TABLE AS new_names
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipedocument_{model}_renamed();
+"""
+
+# Existing recipes are not rendered here: that would hold the trigger
+# locks on every recipe table for the whole backfill. Reads fall back to
+# the recipe tables until `manage.py rebuild_recipe_documents` has run.
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS core_recipedocument_recipe_insert ON core_recipe;
+DROP TRIGGER IF EXISTS core_recipedocument_recipe_update ON core_recipe;
+DROP TRIGGER IF EXISTS core_recipedocument_recipe_delete ON core_recipe;
+DROP TRIGGER IF EXISTS core_recipedocument_tag_link_insert ON core_recipe_tags;
+DROP TRIGGER IF EXISTS core_recipedocument_tag_link_delete ON core_recipe_tags;
+DROP TRIGGER IF EXISTS core_recipedocument_tag_rename ON core_tag;
+DROP TRIGGER IF EXISTS core_recipedocument_ingredient_link_insert
+    ON core_recipe_ingredients;
+DROP TRIGGER IF EXISTS core_recipedocument_ingredient_link_delete
+    ON core_recipe_ingredients;
+DROP TRIGGER IF EXISTS core_recipedocument_ingredient_rename ON core_ingredient;
+DROP FUNCTION IF EXISTS core_recipedocument_tag_renamed();
+DROP FUNCTION IF EXISTS core_recipedocument_ingredient_renamed();
+DROP FUNCTION IF EXISTS core_recipedocument_links_changed();
+DROP FUNCTION IF EXISTS core_recipedocument_recipes_deleted();
+DROP FUNCTION IF EXISTS core_recipedocument_recipes_written();
+DROP FUNCTION IF EXISTS core_recipedocument_refresh(bigint[]);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_modified_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='document', serialize=False, to='core.recipe')),
+                ('data', models.JSONField()),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:35
+
+from django.db import migrations, models
+
+NESTED_SQL = """
+    {field} AS (
+        SELECT link.recipe_id,
+            jsonb_agg(jsonb_build_object('id', n.id, 'name', n.name) ORDER BY n.id)
+                AS items
+        FROM core_recipe_{field} link JOIN core_{model} n ON n.id = link.{model}_id
+        WHERE link.recipe_id = ANY(recipe_ids)
+        GROUP BY link.recipe_id
+    )
+"""
+
+# same function as in 0015, with image_variants added to the documents;
+# documents written before lack the key and are read through the recipe
+# tables until rebuild_recipe_documents re-renders them
+REFRESH_SQL = f"""
+CREATE OR REPLACE FUNCTION core_recipedocument_refresh(recipe_ids bigint[])
+RETURNS void AS $$
+    WITH {NESTED_SQL.format(field='tags', model='tag')},
+    {NESTED_SQL.format(field='ingredients', model='ingredient')}
+    INSERT INTO core_recipedocument (recipe_id, user_id, data)
+    SELECT r.id, r.user_id, jsonb_build_object(
+        'id', r.id,
+        'title', r.title,
+        'ingredients', COALESCE(ingredients.items, '[]'::jsonb),
+        'time_minutes', r.time_minutes,
+        'price', r.price::text,
+        'tags', COALESCE(tags.items, '[]'::jsonb),
+        'link', r.link,
+        'description', r.description,
+        'image', NULLIF(r.image, ''){{variants}}
+    )
+    FROM core_recipe r
+    LEFT JOIN tags ON tags.recipe_id = r.id
+    LEFT JOIN ingredients ON ingredients.recipe_id = r.id
+    WHERE r.id = ANY(recipe_ids)
+    ON CONFLICT (recipe_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, data = EXCLUDED.data;
+$$ LANGUAGE sql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipedocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.RunSQL(
+            REFRESH_SQL.format(
+                variants=",\n        'image_variants', r.image_variants"
+            ),
+            REFRESH_SQL.format(variants=""),
+        ),
+    ]
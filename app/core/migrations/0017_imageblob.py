@@ -0,0 +1,99 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:42
+
+from django.db import migrations, models
+
+# ref_count follows core_recipe.image through statement level triggers;
+# images without a blob (named before content addressing) match no row
+CREATE_TRIGGERS = """
+CREATE FUNCTION core_imageblob_adjust(added text[], removed text[])
+RETURNS void AS $$
+    UPDATE core_imageblob b SET ref_count = b.ref_count + d.delta
+    FROM (
+        SELECT name, sum(delta) AS delta FROM (
+            SELECT unnest(added) AS name, 1 AS delta
+            UNION ALL
+            SELECT unnest(removed), -1
+        ) changes
+        GROUP BY name
+        HAVING sum(delta) <> 0
+    ) d
+    WHERE b.name = d.name;
+$$ LANGUAGE sql;
+
+CREATE FUNCTION core_imageblob_recipes_inserted() RETURNS trigger AS $$
+BEGIN
+    PERFORM core_imageblob_adjust(
+        ARRAY(SELECT image FROM new_rows WHERE image <> ''), '{}'
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION core_imageblob_recipes_updated() RETURNS trigger AS $$
+BEGIN
+    PERFORM core_imageblob_adjust(
+        ARRAY(
+            SELECT n.image FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE n.image IS DISTINCT FROM o.image AND n.image <> ''
+        ),
+        ARRAY(
+            SELECT o.image FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE n.image IS DISTINCT FROM o.image AND o.image <> ''
+        )
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION core_imageblob_recipes_deleted() RETURNS trigger AS $$
+BEGIN
+    PERFORM core_imageblob_adjust(
+        '{}', ARRAY(SELECT image FROM old_rows WHERE image <> '')
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_imageblob_recipe_insert
+    AFTER INSERT ON core_recipe REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_imageblob_recipes_inserted();
+CREATE TRIGGER core_imageblob_recipe_update
+    AFTER UPDATE ON core_recipe
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_imageblob_recipes_updated();
+CREATE TRIGGER core_imageblob_recipe_delete
+    AFTER DELETE ON core_recipe REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_imageblob_recipes_deleted();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS core_imageblob_recipe_insert ON core_recipe;
+DROP TRIGGER IF EXISTS core_imageblob_recipe_update ON core_recipe;
+DROP TRIGGER IF EXISTS core_imageblob_recipe_delete ON core_recipe;
+DROP FUNCTION IF EXISTS core_imageblob_recipes_inserted();
+DROP FUNCTION IF EXISTS core_imageblob_recipes_updated();
+DROP FUNCTION IF EXISTS core_imageblob_recipes_deleted();
+DROP FUNCTION IF EXISTS core_imageblob_adjust(text[], text[]);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('variants', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
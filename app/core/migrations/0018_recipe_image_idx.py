@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:45
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0017_imageblob'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['image'], name='recipe_image_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
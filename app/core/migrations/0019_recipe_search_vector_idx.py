@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-17 09:10
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+# IF NOT EXISTS: databases migrated before 0012 was split already have it
+CREATE_INDEX = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS recipe_search_vector_idx
+    ON core_recipe USING gin (search_vector);
+"""
+
+DROP_INDEX = """
+DROP INDEX CONCURRENTLY IF EXISTS recipe_search_vector_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0018_recipe_image_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_INDEX,
+            DROP_INDEX,
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='recipe',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+                ),
+            ],
+        ),
+    ]
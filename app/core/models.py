@@ -1,5 +1,7 @@
 from decimal import Decimal
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 import os
@@ -122,6 +124,26 @@ class Recipe(models.Model):
     tags = models.ManyToManyField("Tag")
     ingredients = models.ManyToManyField("Ingredient")
     image = models.ImageField(null=True, upload_to=recipe_image_fileptah)
+    # {"<size>": {"<format>": name}} of resized copies, filled in the
+    # background once an image is uploaded
+    image_variants = models.JSONField(default=dict, editable=False)
+    # maintained by a database trigger from title (A) and description (B)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # validator for conditional GETs, also touched when a linked name changes
+    modified_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # recipe lists filter by owner and page newest first
+            models.Index(fields=["user", "-id"], name="recipe_user_id_desc_idx"),
+            GinIndex(fields=["search_vector"], name="recipe_search_vector_idx"),
+            # orphan media collection looks images up by name and prefix
+            models.Index(
+                fields=["image"],
+                name="recipe_image_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -136,6 +158,22 @@ class Tag(models.Model):
     )
     name = models.CharField(max_length=255)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                name="unique_tag_name_per_user",
+            ),
+        ]
+        indexes = [
+            # autocomplete: trigram similarity and prefix matches on name
+            GinIndex(
+                fields=["name"],
+                name="tag_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -149,5 +187,69 @@ class Ingredient(models.Model):
     )
     name = models.CharField(max_length=255)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                name="unique_ingredient_name_per_user",
+            ),
+        ]
+        indexes = [
+            # autocomplete: trigram similarity and prefix matches on name
+            GinIndex(
+                fields=["name"],
+                name="ingredient_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeDocument(models.Model):
+    """Rendered RecipeDetailSerializer payload of one recipe.
+
+    Written only by database triggers on recipes, their tag/ingredient
+    links and tag/ingredient names (see migration 0015), so every write
+    path, bulk SQL included, updates it inside the writing transaction.
+    `image` holds the stored file name; readers turn it into a URL.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        on_delete=models.DO_NOTHING,
+        related_name="document",
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_index=False,
+        related_name="+",
+    )
+    data = models.JSONField()
+
+    def __str__(self):
+        return f"Document of recipe {self.recipe_id}"
+
+
+class ImageBlob(models.Model):
+    """A stored recipe image, named by the SHA-256 of its content.
+
+    Uploads with the same content share one file. `ref_count` is the
+    number of recipes whose image is `name`, kept by database triggers
+    on recipes (see migration 0017); blobs at zero are no longer used
+    and can be removed together with their files.
+    """
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=100, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    # resized copies shared by every recipe using this blob
+    variants = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
         return self.name
@@ -1,8 +1,18 @@
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
 from unittest.mock import patch
+from PIL import Image
 from psycopg2 import OperationalError as Psycopg2Error
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from io import StringIO
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from core.models import ImageBlob, Recipe, RecipeDocument, Tag
 
 
 @patch("core.management.commands.wait_for_db.Command.check")
@@ -25,3 +35,480 @@ class CommandTests(SimpleTestCase):
         call_command("wait_for_db")
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=["default"])
+
+
+class BenchRecipeIndexesTests(TestCase):
+    """Test the recipe index benchmark command"""
+
+    def test_reports_both_plans_and_rolls_back(self):
+        """Test plans are printed for both index states and data is discarded"""
+        out = StringIO()
+        call_command(
+            "bench_recipe_indexes",
+            users=1,
+            recipes=20,
+            names=5,
+            stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn("With access path indexes", output)
+        self.assertIn("Without access path indexes", output)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchRecipeListTests(TestCase):
+    """Test the recipe list read path benchmark command"""
+
+    def test_reports_sizes_and_rolls_back(self):
+        """Test each size is timed, outputs match and data is discarded"""
+        out = StringIO()
+        call_command("bench_recipe_list", sizes=[5, 20], repeat=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn("    20 recipes", output)
+        self.assertEqual(output.count("identical output: yes"), 2)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchAPIMiddlewareTests(TestCase):
+    """Test the middleware chain benchmark command"""
+
+    def test_reports_both_chains(self):
+        """Test each path is served and timed through both chains"""
+        out = StringIO()
+        call_command(
+            "bench_api_middleware",
+            requests=2,
+            rounds=1,
+            paths=["/api/user/me/"],
+            stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn("full: 0 queries, status 200", output)
+        self.assertIn("lean: 0 queries, status 200", output)
+        self.assertIn("/api/user/me/ saved", output)
+        self.assertFalse(
+            get_user_model().objects.filter(username="bench-middleware").exists()
+        )
+
+
+class BackfillSearchVectorsTests(TestCase):
+    """Test filling search vectors of recipes written before the trigger"""
+
+    def test_fills_missing_vectors_in_batches(self):
+        """Test NULL vectors are computed like the trigger does"""
+        user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        recipes = [
+            Recipe.objects.create(
+                user=user,
+                title=f"Curry {i}",
+                description="Spicy rice",
+                time_minutes=5,
+                price=Decimal("1.00"),
+            )
+            for i in range(5)
+        ]
+        expected = dict(Recipe.objects.values_list("id", "search_vector"))
+        Recipe.objects.filter(id__in=[r.id for r in recipes[1:]]).update(
+            search_vector=None
+        )
+        out = StringIO()
+
+        call_command("backfill_search_vectors", batch_size=2, stdout=out)
+
+        self.assertIn("Filled 4 search vectors", out.getvalue())
+        self.assertEqual(
+            dict(Recipe.objects.values_list("id", "search_vector")),
+            expected,
+        )
+
+
+class APICacheMetricsTests(SimpleTestCase):
+    """Test the response cache metrics report"""
+
+    def test_reports_shared_counters(self):
+        """Test counts come from the shared cache"""
+        with patch(
+            "core.management.commands.api_cache_metrics.cache_metrics",
+            return_value={"hits": 3, "misses": 1},
+        ):
+            out = StringIO()
+            call_command("api_cache_metrics", stdout=out)
+
+        self.assertIn("hits 3, misses 1, hit rate 75.0%", out.getvalue())
+
+
+class BenchRecipeThumbnailsTests(SimpleTestCase):
+    """Test the image variant benchmark command"""
+
+    def test_reports_each_pool_size(self):
+        """Test inline and pooled runs are timed"""
+        out = StringIO()
+        call_command(
+            "bench_recipe_thumbnails",
+            images=2,
+            width=300,
+            height=400,
+            workers=[0, 1],
+            stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn("workers  0:", output)
+        self.assertIn("workers  1:", output)
+
+    def test_rejects_bad_arguments(self):
+        """Test an empty run is refused"""
+        with self.assertRaises(CommandError):
+            call_command("bench_recipe_thumbnails", images=0)
+
+
+class GenerateRecipeVariantsTests(TestCase):
+    """Test backfilling image variants"""
+
+    def test_renders_missing_variants(self):
+        """Test only images without variants are rendered"""
+        user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        with tempfile.TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media):
+                os.makedirs(os.path.join(media, "uploads", "recipe"))
+                Image.new("RGB", (300, 300)).save(
+                    os.path.join(media, "uploads", "recipe", "a.jpg")
+                )
+                pending = Recipe.objects.create(
+                    user=user,
+                    image="uploads/recipe/a.jpg",
+                )
+                done = Recipe.objects.create(
+                    user=user,
+                    image="uploads/recipe/b.jpg",
+                    image_variants={"200": {}},
+                )
+                Recipe.objects.create(user=user)
+                out = StringIO()
+
+                call_command("generate_recipe_variants", workers=1, stdout=out)
+
+                pending.refresh_from_db()
+                done.refresh_from_db()
+                self.assertEqual(list(pending.image_variants), ["200"])
+                self.assertEqual(done.image_variants, {"200": {}})
+                self.assertIn("Rendered 1 images, 0 failed", out.getvalue())
+
+
+class CollectOrphanMediaTests(TestCase):
+    """Test deleting recipe images nothing refers to"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.live = [
+            "uploads/recipe/ab/live.jpg",
+            "uploads/recipe/ab/variants/live-200.webp",
+            "uploads/recipe/old-uuid_x1.png",
+        ]
+        self.orphans = [
+            "uploads/recipe/ab/gone.jpg",
+            "uploads/recipe/ab/variants/gone-200.webp",
+            "uploads/recipe/ab/variants/gone-600.jpg",
+            "uploads/recipe/ab/variants/live-200.webp.123.part",
+            "uploads/recipe/cd/other.png",
+        ]
+        for name in self.live + self.orphans:
+            self._write(name, age=7200)
+        self._write("uploads/recipe/cd/uploading.jpg", age=0)
+        Recipe.objects.create(user=user, image=self.live[0])
+        Recipe.objects.create(user=user, image=self.live[2])
+        ImageBlob.objects.create(
+            digest="gone",
+            name="uploads/recipe/ab/gone.jpg",
+            size=5,
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def _write(self, name, age):
+        path = os.path.join(self.media.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as image_file:
+            image_file.write("image")
+        past = time.time() - age
+        os.utime(path, (past, past))
+
+    def _exists(self, name):
+        return os.path.exists(os.path.join(self.media.name, name))
+
+    def test_dry_run_deletes_nothing(self):
+        """Test a dry run only reports the orphans"""
+        out = StringIO()
+        call_command("collect_orphan_media", dry_run=True, stdout=out)
+
+        self.assertIn("Checked 9 files. Would delete 5", out.getvalue())
+        self.assertTrue(all(self._exists(name) for name in self.orphans))
+        self.assertTrue(ImageBlob.objects.exists())
+
+    def test_deletes_only_unreferenced_old_files(self):
+        """Test orphans and their variants go, live and young files stay"""
+        out = StringIO()
+        call_command("collect_orphan_media", batch_size=2, stdout=out)
+
+        self.assertIn("Deleted 5", out.getvalue())
+        self.assertFalse(any(self._exists(name) for name in self.orphans))
+        self.assertTrue(all(self._exists(name) for name in self.live))
+        self.assertTrue(self._exists("uploads/recipe/cd/uploading.jpg"))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_resumes_from_checkpoint(self):
+        """Test --limit stops early and the next run picks up from there"""
+        checkpoint = os.path.join(self.media.name, "gc.checkpoint")
+        out = StringIO()
+        call_command(
+            "collect_orphan_media",
+            limit=4,
+            checkpoint=checkpoint,
+            stdout=out,
+        )
+        self.assertIn("Checked 4 files. Deleted 3", out.getvalue())
+        with open(checkpoint) as progress:
+            self.assertEqual(
+                progress.read(),
+                "uploads/recipe/ab/variants/gone-600.jpg",
+            )
+
+        out = StringIO()
+        call_command("collect_orphan_media", checkpoint=checkpoint, stdout=out)
+
+        self.assertIn("Checked 5 files. Deleted 2", out.getvalue())
+        self.assertFalse(any(self._exists(name) for name in self.orphans))
+        with open(checkpoint) as progress:
+            self.assertEqual(progress.read(), "")
+
+    def test_reused_file_is_kept(self):
+        """Test a file touched after the walk saw it survives"""
+        real_rename = os.rename
+
+        def touch_then_rename(src, dst):
+            # an upload reuses the blob between the walk and the delete
+            os.utime(src)
+            real_rename(src, dst)
+
+        with patch(
+            "core.management.commands.collect_orphan_media.os.rename",
+            side_effect=touch_then_rename,
+        ):
+            call_command("collect_orphan_media", stdout=StringIO())
+
+        self.assertTrue(all(self._exists(name) for name in self.orphans))
+
+
+class RecipeDocumentCommandsTests(TestCase):
+    """Test the recipe document rebuild and check commands"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.recipes = [
+            Recipe.objects.create(user=self.user, title=f"r{i}") for i in range(3)
+        ]
+
+    def test_check_reports_drift(self):
+        """Test missing and stale documents are reported and can be fixed"""
+        RecipeDocument.objects.filter(recipe=self.recipes[0]).delete()
+        RecipeDocument.objects.filter(recipe=self.recipes[1]).update(data={})
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "2 documents out of sync"):
+            call_command("check_recipe_documents", stdout=out)
+        self.assertIn(f"Recipe {self.recipes[0].id}: missing", out.getvalue())
+        self.assertIn(f"Recipe {self.recipes[1].id}: stale", out.getvalue())
+
+        call_command("check_recipe_documents", fix=True, stdout=StringIO())
+        out = StringIO()
+        call_command("check_recipe_documents", stdout=out)
+        self.assertIn("All documents in sync", out.getvalue())
+
+    def test_rebuild(self):
+        """Test every document is rebuilt in batches"""
+        RecipeDocument.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_recipe_documents", batch_size=2, stdout=out)
+        self.assertIn("Rebuilt 3 documents", out.getvalue())
+        self.assertEqual(RecipeDocument.objects.count(), 3)
+
+
+class ExportRecipesTests(TestCase):
+    """Test the NDJSON recipe export command"""
+
+    def test_export_to_stdout(self):
+        """Test recipes are written one JSON object per line"""
+        user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        first = Recipe.objects.create(user=user, title="first")
+        second = Recipe.objects.create(user=user, title="second")
+        out = StringIO()
+        call_command(
+            "export_recipes",
+            "test@example.com",
+            after=first.id,
+            chunk_size=1,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["id"], second.id)
+
+    def test_sql_export_matches(self):
+        """Test --sql writes the same recipes as the serializer export"""
+        user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        recipe = Recipe.objects.create(
+            user=user,
+            title="first",
+            image="uploads/recipe/x.png",
+        )
+        recipe.tags.add(Tag.objects.create(user=user, name="t"))
+        Recipe.objects.create(user=user, title="second", price=Decimal("2"))
+        outputs = []
+        for sql in (False, True):
+            out = StringIO()
+            call_command("export_recipes", "test@example.com", sql=sql, stdout=out)
+            lines = out.getvalue().splitlines()
+            outputs.append([json.loads(line) for line in lines])
+        self.assertEqual(outputs[0], outputs[1])
+
+
+class ImportRecipesTests(TestCase):
+    """Test the bulk recipe import command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_import_ndjson(self):
+        """Test NDJSON rows are imported with deduplicated names"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        rows = [
+            {
+                "title": f"recipe{i}",
+                "time_minutes": i,
+                "price": "1.25",
+                "description": "line\n\ttab \\N back\\slash",
+                "tags": [{"name": "Vegan"}, {"name": f"tag{i % 2}"}],
+                "ingredients": [{"name": "Salt"}],
+            }
+            for i in range(5)
+        ]
+        path = self._write(
+            "recipes.ndjson",
+            "\n".join(json.dumps(row) for row in rows),
+        )
+        out = StringIO()
+        call_command(
+            "import_recipes",
+            path,
+            email=self.user.email,
+            batch_size=2,
+            stdout=out,
+        )
+        self.assertIn("rows/s", out.getvalue())
+        recipes = Recipe.objects.filter(user=self.user).order_by("id")
+        self.assertEqual(recipes.count(), 5)
+        self.assertEqual(
+            sorted(t.name for t in recipes[4].tags.all()),
+            ["Vegan", "tag0"],
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(recipes[0].ingredients.get().name, "Salt")
+        self.assertEqual(recipes[0].description, rows[0]["description"])
+        self.assertEqual(recipes[0].price, Decimal("1.25"))
+
+    def test_import_csv_skips_invalid_rows(self):
+        """Test CSV rows are imported and invalid rows are skipped"""
+        path = self._write(
+            "recipes.csv",
+            "title,time_minutes,price,tags,ingredients\n"
+            "Soup,10,2.50,Hot;Quick,Water;Salt\n"
+            "Broken,abc,1,,\n",
+        )
+        err = StringIO()
+        call_command(
+            "import_recipes",
+            path,
+            email=self.user.email,
+            stdout=StringIO(),
+            stderr=err,
+        )
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, "Soup")
+        self.assertEqual(recipe.ingredients.count(), 2)
+        self.assertIn("Skipping row 2", err.getvalue())
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test rows before the checkpoint are not imported again"""
+        path = self._write(
+            "recipes.ndjson",
+            "\n".join(json.dumps({"title": f"r{i}"}) for i in range(4)),
+        )
+        checkpoint = self._write("checkpoint", "2")
+        call_command(
+            "import_recipes",
+            path,
+            email=self.user.email,
+            checkpoint=checkpoint,
+            stdout=StringIO(),
+        )
+        titles = list(
+            Recipe.objects.order_by("id").values_list("title", flat=True)
+        )
+        self.assertEqual(titles, ["r2", "r3"])
+        with open(checkpoint) as f:
+            self.assertEqual(f.read(), "4")
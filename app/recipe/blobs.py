@@ -0,0 +1,102 @@
+"""
+Content addressed storage of recipe images
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+from core.models import ImageBlob, Recipe
+
+BLOB_DIR = posixpath.join("uploads", "recipe")
+# resized copies live in this subdirectory next to their image
+VARIANT_DIR = "variants"
+# names of content addressed files: <BLOB_DIR>/<2 hex>/...
+BLOB_NAME_RE = re.compile(r"^uploads/recipe/[0-9a-f]{2}/")
+# file extension per Pillow format, so equal content gets one name
+EXTENSIONS = {
+    "JPEG": "jpg",
+    "MPO": "jpg",
+    "PNG": "png",
+    "WEBP": "webp",
+    "GIF": "gif",
+}
+
+
+def blob_name(digest, extension):
+    """uploads/recipe/<2 hex>/<sha256>.<ext>, fanned out by digest prefix"""
+    return posixpath.join(BLOB_DIR, digest[:2], f"{digest}.{extension}")
+
+
+def source_key(name):
+    """`dir/stem.` prefix of the image a stored recipe file belongs to.
+
+    An image is its own source, a variant's source is the image it was
+    rendered from; every Recipe.image of that source starts with the key.
+    Leftover partial writes (".part", ".gc") have none.
+    """
+    directory, file_name = posixpath.split(name)
+    if file_name.endswith((".part", ".gc")):
+        return None
+    stem = posixpath.splitext(file_name)[0]
+    if posixpath.basename(directory) == VARIANT_DIR:
+        directory = posixpath.dirname(directory)
+        stem = stem.rsplit("-", 1)[0]
+    return f"{posixpath.join(directory, stem)}."
+
+
+def store_image(file):
+    """Store the validated image upload `file` once per distinct content.
+
+    Returns the storage name to assign to Recipe.image. Content that is
+    already stored is not written again; the new recipe just points at
+    the existing blob, whose ref_count the database triggers raise.
+    Reused files get a fresh mtime, which keeps the orphan collector
+    away from them until the recipe is committed.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()
+    storage = Recipe._meta.get_field("image").storage
+    blob = (
+        ImageBlob.objects.filter(digest=digest)
+        .values_list("name", "variants")
+        .first()
+    )
+    if blob is None:
+        name = blob_name(digest, _extension(file))
+    else:
+        name, variants = blob
+        files = [file for sizes in variants.values() for file in sizes.values()]
+        if not all([_touch(storage, variant) for variant in files]):
+            # collected meanwhile; this upload renders them again
+            ImageBlob.objects.filter(digest=digest).update(variants={})
+    if not _touch(storage, name):
+        file.seek(0)
+        saved = storage.save(name, file)
+        if saved != name:
+            # a concurrent upload of the same content got there first
+            storage.delete(saved)
+    ImageBlob.objects.get_or_create(
+        digest=digest,
+        defaults={"name": name, "size": file.size},
+    )
+    return name
+
+
+def _touch(storage, name):
+    """Set the mtime of stored file `name` to now; False if it is gone"""
+    try:
+        os.utime(storage.path(name))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _extension(file):
+    image = getattr(file, "image", None)
+    if image is not None and image.format in EXTENSIONS:
+        return EXTENSIONS[image.format]
+    return posixpath.splitext(file.name)[1].lstrip(".").lower()
@@ -0,0 +1,161 @@
+"""
+Per-user versioned response cache for recipe API reads
+"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f"api:version:{user_id}"
+
+
+def user_version(user_id):
+    """Return the current cache version of `user_id`'s data.
+
+    A missing counter (first use or eviction) starts from the current time
+    rather than 1, so entries written under an older counter can never be
+    read again.
+    """
+    cache = get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(_version_key(user_id), version, timeout=None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def bump_user_version(user_id):
+    """Invalidate every cached response of `user_id`.
+
+    Bumps now and again once the surrounding transaction commits, so a
+    read racing the write can not cache pre-commit data under the new
+    version.
+    """
+
+    def bump():
+        cache = get_cache()
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def response_cache_key(request):
+    """Key on user, data version, host, path and normalized query string"""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    raw = f"{request.get_host()}{request.path}?{query}"
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    user_id = request.user.pk
+    return f"api:response:{user_id}:{user_version(user_id)}:{digest}"
+
+
+def reset_user_version(user_id):
+    """Start a fresh version for a newly created user.
+
+    User ids can be reused after a database reset, so a new account must
+    not inherit a counter (and cached responses) left behind by an old one.
+    """
+    get_cache().set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def _metrics_key(name):
+    return f"api:metrics:{name}"
+
+
+def count_metric(name):
+    """Add one to counter `name`, shared by every worker via the cache"""
+    cache = get_cache()
+    try:
+        cache.incr(_metrics_key(name))
+    except ValueError:
+        if not cache.add(_metrics_key(name), 1, timeout=None):
+            cache.incr(_metrics_key(name))
+
+
+def cache_metrics():
+    """Return the response cache's hit/miss counters across all workers"""
+    counts = get_cache().get_many([_metrics_key(n) for n in ("hits", "misses")])
+    return {
+        name: counts.get(_metrics_key(name), 0) for name in ("hits", "misses")
+    }
+
+
+class CachedResponseMixin:
+    """Serve list from the per-user response cache.
+
+    Other read actions can opt in through `_cached`. Model writes bump
+    the owner's version through recipe.signals; bulk writes that send no
+    signals must call bump_user_version() themselves.
+
+    Responses carry an ETag (and a Last-Modified when get_validators
+    provides one); a matching If-None-Match or If-Modified-Since is
+    answered with a 304 before the cache or the database is touched.
+    Cached bodies are keyed on their ETag as well as the user's version,
+    so validators derived from other data (such as a recipe's
+    modified_at) always describe the body served with them.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def get_validators(self, request, key):
+        """Return (etag, last_modified timestamp) of the representation.
+
+        Defaults to a weak ETag derived from the cache key, which changes
+        with every bump of the user's version.
+        """
+        return f'W/"{hashlib.sha1(key.encode()).hexdigest()}"', None
+
+    def _cached(self, view, request, *args, **kwargs):
+        key = response_cache_key(request)
+        etag, last_modified = self.get_validators(request, key)
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if not_modified is not None:
+            return self._set_validators(not_modified, etag, last_modified)
+
+        # store bodies under the validator they were rendered for, so a
+        # body is never served with an ETag that came from other data
+        key = f"{key}:{etag}"
+        data = get_cache().get(key)
+        if data is not None:
+            count_metric("hits")
+            response = Response(data, headers={"X-Cache": "HIT"})
+            return self._set_validators(response, etag, last_modified)
+        count_metric("misses")
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            if isinstance(response, Response):
+                # streamed bodies are not cached, only validated
+                get_cache().set(
+                    key, response.data, settings.API_CACHE_TIMEOUT
+                )
+            self._set_validators(response, etag, last_modified)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def _set_validators(self, response, etag, last_modified):
+        if etag:
+            response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,108 @@
+"""
+Reads and maintenance of the RecipeDocument read model
+"""
+
+from django.db import connection
+from django.db.models import prefetch_related_objects
+from core.models import Recipe, RecipeDocument
+from .readers import (
+    nested_prefetches,
+    recipe_list_rows,
+    recipe_list_values,
+)
+from .serializers import RecipeDetailSerializer
+from .variants import image_url, variant_urls
+
+
+def refresh_documents(recipe_ids):
+    """Re-render the documents of `recipe_ids` with the trigger function"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT core_recipedocument_refresh(%s::bigint[])",
+            [list(recipe_ids)],
+        )
+
+
+def is_current(data, fields):
+    """Whether a stored document exists and has every one of `fields`.
+
+    Documents rendered before a field was added lack it until
+    rebuild_recipe_documents re-renders them.
+    """
+    return data is not None and all(name in data for name in fields)
+
+
+def document_data(data, fields, request=None):
+    """Return serializer `fields` of a stored document in serializer order.
+
+    Stored image names are turned into URLs the way ImageField does,
+    absolute when a request is given.
+    """
+    result = {name: data[name] for name in fields}
+    if "image" in result:
+        result["image"] = image_url(result["image"], request)
+    if "image_variants" in result:
+        result["image_variants"] = variant_urls(
+            result["image_variants"],
+            request,
+        )
+    return result
+
+
+def document_list_rows(rows, fields, request=None):
+    """Render rows of {"id", "document__data"} as list payloads.
+
+    A recipe without a current document (not backfilled yet, or written
+    with triggers bypassed) is rendered through the values() path instead.
+    """
+    current = {
+        row["id"]: is_current(row["document__data"], fields) for row in rows
+    }
+    missing = [row["id"] for row in rows if not current[row["id"]]]
+    fallback = {}
+    if missing:
+        values = list(
+            recipe_list_values(Recipe.objects.filter(id__in=missing), fields)
+        )
+        rendered = recipe_list_rows(values, fields, request)
+        fallback = {row["id"]: data for row, data in zip(values, rendered)}
+    return [
+        document_data(row["document__data"], fields, request)
+        if current[row["id"]]
+        else fallback[row["id"]]
+        for row in rows
+    ]
+
+
+def find_drift(recipes, chunk_size=500):
+    """Yield (recipe id, reason) for recipes whose document is out of sync.
+
+    Every recipe is rendered with RecipeDetailSerializer and compared with
+    its stored document.
+    """
+    fields = RecipeDetailSerializer.Meta.fields
+    chunk = []
+    recipes = recipes.defer("search_vector").order_by("id")
+    for recipe in recipes.iterator(chunk_size=chunk_size):
+        chunk.append(recipe)
+        if len(chunk) == chunk_size:
+            yield from _chunk_drift(chunk, fields)
+            chunk = []
+    if chunk:
+        yield from _chunk_drift(chunk, fields)
+
+
+def _chunk_drift(recipes, fields):
+    documents = RecipeDocument.objects.in_bulk([recipe.id for recipe in recipes])
+    prefetch_related_objects(recipes, *nested_prefetches())
+    expected = RecipeDetailSerializer(recipes, many=True).data
+    for recipe, data in zip(recipes, expected):
+        document = documents.get(recipe.id)
+        if document is None:
+            yield recipe.id, "missing"
+        elif document.user_id != recipe.user_id:
+            yield recipe.id, "wrong owner"
+        elif not set(fields) <= set(document.data) or (
+            document_data(document.data, fields) != data
+        ):
+            yield recipe.id, "stale"
@@ -0,0 +1,68 @@
+"""
+Streaming NDJSON export of recipes
+"""
+
+import json
+from django.db.models import prefetch_related_objects
+from rest_framework.utils.encoders import JSONEncoder
+from core.models import Recipe
+from .readers import nested_prefetches
+from .serializers import RecipeDetailSerializer
+from .sqljson import iter_recipe_json
+
+
+def iter_recipe_ndjson(user, after=None, chunk_size=500, context=None):
+    """Yield one JSON line per recipe of `user`, oldest first.
+
+    Rows come from a server-side cursor and tags/ingredients are prefetched
+    one chunk at a time, so memory is bounded by `chunk_size` regardless of
+    how many recipes the user owns. Pass the last exported id as `after`
+    to resume an interrupted export.
+    """
+    queryset = (
+        Recipe.objects.filter(user=user).defer("search_vector").order_by("id")
+    )
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    chunk = []
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(recipe)
+        if len(chunk) == chunk_size:
+            yield from _render_chunk(chunk, context)
+            chunk = []
+    if chunk:
+        yield from _render_chunk(chunk, context)
+
+
+def _render_chunk(recipes, context):
+    prefetch_related_objects(recipes, *nested_prefetches())
+    serializer = RecipeDetailSerializer(
+        recipes,
+        many=True,
+        context=context or {},
+    )
+    for data in serializer.data:
+        yield json.dumps(data, cls=JSONEncoder) + "\n"
+
+
+def iter_recipe_ndjson_sql(user, after=None, chunk_size=500, media_url=""):
+    """Like iter_recipe_ndjson, with each line built by PostgreSQL.
+
+    One statement assembles every recipe with json_agg'ed tags and
+    ingredients; the text is streamed as is. `media_url` prefixes image
+    names the way the serializer's request-aware ImageField would.
+    """
+    where = "WHERE r.user_id = %s"
+    params = [user.pk]
+    if after is not None:
+        where += " AND r.id > %s"
+        params.append(after)
+    lines = iter_recipe_json(
+        RecipeDetailSerializer.Meta.fields,
+        f"{where} ORDER BY r.id",
+        params,
+        chunk_size=chunk_size,
+        media_url=media_url,
+    )
+    for line in lines:
+        yield line + "\n"
@@ -0,0 +1,48 @@
+"""
+Tag and ingredient facet counts over a recipe queryset
+"""
+
+from django.db.models import Count, F, Value
+from core.models import Recipe
+
+FACET_FIELDS = ("tags", "ingredients")
+
+
+def facet_counts(recipes):
+    """Return {"tags": [...], "ingredients": [...]} for `recipes`.
+
+    Each entry is {"id", "name", "count"}, most used first. Both relations
+    are counted in one statement: a UNION ALL of GROUP BYs over the
+    through tables, restricted to the ids of `recipes`.
+    """
+    recipe_ids = recipes.order_by().values("id")
+    queries = []
+    for field in FACET_FIELDS:
+        m2m = Recipe._meta.get_field(field)
+        target = m2m.m2m_reverse_field_name()
+        queries.append(
+            m2m.remote_field.through.objects.filter(
+                **{f"{m2m.m2m_field_name()}__in": recipe_ids}
+            )
+            .order_by()
+            .values(
+                facet=Value(field),
+                facet_id=F(target),
+                facet_name=F(f"{target}__name"),
+            )
+            .annotate(count=Count("*"))
+        )
+    facets = {field: [] for field in FACET_FIELDS}
+    rows = queries[0].union(*queries[1:], all=True).order_by(
+        "-count",
+        "facet_name",
+    )
+    for row in rows:
+        facets[row["facet"]].append(
+            {
+                "id": row["facet_id"],
+                "name": row["facet_name"],
+                "count": row["count"],
+            }
+        )
+    return facets
@@ -0,0 +1,30 @@
+"""
+pg_trgm word similarity support missing from Django 3.2
+"""
+
+from django.contrib.postgres.lookups import PostgresOperatorLookup
+from django.db.models import CharField, FloatField, Func, Value
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """`field %> value`: value is word-similar to part of field.
+
+    Unlike trigram_similar this scores prefixes of longer names highly,
+    and it is served by a gin_trgm_ops index on the field.
+    """
+
+    lookup_name = "trigram_word_similar"
+    postgres_operator = "%%>"
+
+
+class TrigramWordSimilarity(Func):
+    """word_similarity(string, expression) for ranking matches"""
+
+    function = "WORD_SIMILARITY"
+    output_field = FloatField()
+
+    def __init__(self, string, expression, **extra):
+        if not hasattr(string, "resolve_expression"):
+            string = Value(string)
+        super().__init__(string, expression, **extra)
@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination for recipes, newest first.
+
+    The cursor encodes the last seen id so every page is a
+    ``WHERE id < cursor ORDER BY id DESC LIMIT n`` index scan,
+    independent of how deep the client has paged.
+    """
+
+    page_size = settings.RECIPE_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+    ordering = "-id"
+
+    def get_ordering(self, request, queryset, view):
+        """Order search results by rank, using id to break ties"""
+        if "search_rank" in queryset.query.annotations:
+            return ("-search_rank", "-id")
+        return super().get_ordering(request, queryset, view)
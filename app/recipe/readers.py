@@ -0,0 +1,103 @@
+"""
+Values based read path for recipe responses
+"""
+
+from decimal import Decimal
+from django.db.models import Prefetch
+from core.models import Recipe
+from .serializers import RecipeSerializer
+from .variants import image_url, variant_urls
+
+NESTED_FIELDS = ("tags", "ingredients")
+
+
+def nested_prefetches(fields=None):
+    """Prefetch tags/ingredients in the order recipe_list_rows uses.
+
+    Relations missing from `fields` are skipped; None prefetches both.
+    """
+    prefetches = []
+    for field in NESTED_FIELDS:
+        if fields is not None and field not in fields:
+            continue
+        model = Recipe._meta.get_field(field).related_model
+        prefetches.append(Prefetch(field, queryset=model.objects.order_by("id")))
+    return prefetches
+
+
+def recipe_list_values(queryset, fields=None):
+    """Select the columns of serializer `fields` (and annotations) as dicts.
+
+    `fields` defaults to RecipeSerializer's; id is always selected since
+    nested lists and cursors need it.
+    """
+    fields = fields or RecipeSerializer.Meta.fields
+    columns = ["id"] + [
+        name for name in fields if name not in NESTED_FIELDS and name != "id"
+    ]
+    return queryset.values(*columns, *queryset.query.annotation_select)
+
+
+def recipe_list_rows(rows, fields=None, request=None):
+    """Build serializer output for `fields` from `recipe_list_values` rows.
+
+    Tags and ingredients are fetched with one query per requested
+    relation straight from the through table, ordered by id like the
+    detail prefetch, and no model or serializer instances are created.
+    """
+    fields = fields or RecipeSerializer.Meta.fields
+    ids = [row["id"] for row in rows]
+    nested = {
+        field: _group_names(field, ids)
+        for field in NESTED_FIELDS
+        if field in fields
+    }
+    price = _decimal_formatter(Recipe._meta.get_field("price"))
+    results = []
+    for row in rows:
+        data = {}
+        for name in fields:
+            if name in NESTED_FIELDS:
+                data[name] = nested[name].get(row["id"], [])
+            elif name == "price":
+                data[name] = price(row[name])
+            elif name == "image":
+                data[name] = image_url(row[name], request)
+            elif name == "image_variants":
+                data[name] = variant_urls(row[name], request)
+            else:
+                data[name] = row[name]
+        results.append(data)
+    return results
+
+
+def _group_names(field, recipe_ids):
+    """Map recipe id -> [{"id", "name"}] for the `field` M2M relation"""
+    grouped = {}
+    if not recipe_ids:
+        return grouped
+    m2m = Recipe._meta.get_field(field)
+    recipe_column = m2m.m2m_field_name()
+    target = m2m.m2m_reverse_field_name()
+    links = (
+        m2m.remote_field.through.objects.filter(
+            **{f"{recipe_column}__in": recipe_ids}
+        )
+        .order_by(target)
+        .values_list(recipe_column, target, f"{target}__name")
+    )
+    for recipe_id, pk, name in links:
+        grouped.setdefault(recipe_id, []).append({"id": pk, "name": name})
+    return grouped
+
+
+def _decimal_formatter(field):
+    """Format like DRF's DecimalField with COERCE_DECIMAL_TO_STRING"""
+    exponent = Decimal(1).scaleb(-field.decimal_places)
+
+    def format_decimal(value):
+        if value is None:
+            return None
+        return f"{value.quantize(exponent):f}"
+
+    return format_decimal
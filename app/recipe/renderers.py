@@ -0,0 +1,57 @@
+"""
+Fast JSON rendering for recipe responses
+"""
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson.
+
+    With the default compact/unicode settings it produces the same bytes
+    as the stock renderer for payloads without floats: types orjson does
+    not know (Decimal, datetimes, lazy strings) go through DRF's
+    JSONEncoder, and U+2028/U+2029 are escaped the same way. Indented
+    output and anything orjson refuses (non-str keys, lone surrogates,
+    huge ints) fall back to the stock renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if (
+            self.get_indent(accepted_media_type, renderer_context)
+            or not self.compact
+            or self.ensure_ascii
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=ORJSON_OPTIONS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """Newline delimited JSON, for the export stream.
+
+    Streamed exports build their lines themselves; this renders anything
+    else answered to an NDJSON request (errors) as one JSON line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        ret = super().render(data, accepted_media_type, renderer_context)
+        return ret + b"\n" if ret else ret
@@ -1,5 +1,12 @@
 from core.models import Recipe, Tag, Ingredient
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import UnidentifiedImageError
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from .uploads import ImageTooLarge, check_image_header
+from .variants import variant_urls
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -20,7 +27,108 @@ class IngredientSerializer(serializers.ModelSerializer):
         ]
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class TagCountSerializer(TagSerializer):
+    """Tag with the number of recipes using it"""
+
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ["recipe_count"]
+
+
+class IngredientCountSerializer(IngredientSerializer):
+    """Ingredient with the number of recipes using it"""
+
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ["recipe_count"]
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Creates many recipes at once with set-based SQL"""
+
+    def create(self, validated_data):
+        nested = [
+            {
+                field: item.pop(field, [])
+                for field in ("tags", "ingredients")
+            }
+            for item in validated_data
+        ]
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(**item) for item in validated_data]
+        )
+        for field, model in (("tags", Tag), ("ingredients", Ingredient)):
+            items = [item for links in nested for item in links[field]]
+            ids = {
+                obj.name: obj.id
+                for obj in self.child._bulk_get_or_create(model, items)
+            }
+            m2m = Recipe._meta.get_field(field)
+            through = m2m.remote_field.through
+            through.objects.bulk_create(
+                [
+                    through(
+                        **{
+                            m2m.m2m_column_name(): recipe.id,
+                            m2m.m2m_reverse_name(): ids[item["name"]],
+                        }
+                    )
+                    for recipe, links in zip(recipes, nested)
+                    for item in links[field]
+                ],
+                ignore_conflicts=True,
+            )
+        return recipes
+
+
+class BoundedImageField(serializers.ImageField):
+    """ImageField that checks size, format and dimensions before decoding"""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            # never open a path or anything else a client names
+            self.fail("invalid")
+        if data.size > settings.RECIPE_IMAGE_MAX_BYTES:
+            raise serializers.ValidationError(ImageTooLarge().detail)
+        try:
+            check_image_header(
+                data.temporary_file_path()
+                if hasattr(data, "temporary_file_path")
+                else data
+            )
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            self.fail("invalid_image")
+        finally:
+            data.seek(0)
+        return super().to_internal_value(data)
+
+
+@extend_schema_field(OpenApiTypes.OBJECT)
+class ImageVariantsField(serializers.Field):
+    """URLs of the resized copies of a recipe image, by size and format"""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return variant_urls(value, self.context.get("request"))
+
+
+class SparseFieldsMixin:
+    """Drop every field not listed in context["fields"], when given"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.context.get("fields")
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for recipe List View"""
 
     ingredients = IngredientSerializer(many=True, required=False)
@@ -40,24 +148,32 @@ class RecipeSerializer(serializers.ModelSerializer):
         read_only_fields = [
             "id",
         ]
+        list_serializer_class = RecipeListSerializer
 
-    def _get_or_create_tags(self, tags, recipe):
+    def _bulk_get_or_create(self, model, items):
+        """Return the user's `model` rows for `items`, inserting missing names.
+
+        Runs one INSERT ... ON CONFLICT DO NOTHING followed by one SELECT,
+        relying on the (user, name) unique constraint so concurrent
+        requests can not create duplicates.
+        """
         auth_user = self.context["request"].user
-        for tag in tags:
-            tag_object, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_object)
+        names = list(dict.fromkeys(item["name"] for item in items))
+        if not names:
+            return []
+        model.objects.bulk_create(
+            [model(user=auth_user, name=name) for name in names],
+            ignore_conflicts=True,
+        )
+        return list(model.objects.filter(user=auth_user, name__in=names))
+
+    def _get_or_create_tags(self, tags, recipe):
+        recipe.tags.add(*self._bulk_get_or_create(Tag, tags))
 
     def _get_or_create_ingredients(self, ingredients, recipe):
-        auth_user = self.context["request"].user
-        for ingredient in ingredients:
-            ingredient_object, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_object)
+        recipe.ingredients.add(
+            *self._bulk_get_or_create(Ingredient, ingredients)
+        )
 
     def create(self, validated_data):
         tags = validated_data.pop("tags", [])
@@ -68,33 +184,60 @@ class RecipeSerializer(serializers.ModelSerializer):
         return recipe
 
     def update(self, instance, validated_data):
-        tags = validated_data.pop("tags", [])
-        ingredients = validated_data.pop("ingredients", [])
+        tags = validated_data.pop("tags", None)
+        ingredients = validated_data.pop("ingredients", None)
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.ingredients.clear()
-        self._get_or_create_tags(tags, instance)
-        self._get_or_create_ingredients(ingredients, instance)
-        instance.save()
+        # set() diffs against the current links, so unchanged lists cost a
+        # single SELECT and only added/removed rows touch the through table
+        if tags is not None:
+            instance.tags.set(self._bulk_get_or_create(Tag, tags))
+        if ingredients is not None:
+            instance.ingredients.set(
+                self._bulk_get_or_create(Ingredient, ingredients)
+            )
         return instance
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe Detail Views"""
 
+    image = BoundedImageField(required=False, allow_null=True)
+    image_variants = ImageVariantsField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ["description", "image"]
+        fields = RecipeSerializer.Meta.fields + [
+            "description",
+            "image",
+            "image_variants",
+        ]
+
+
+class RecipeBatchOperationSerializer(serializers.Serializer):
+    """One create, update or delete operation of a recipe batch"""
+
+    op = serializers.ChoiceField(choices=["create", "update", "delete"])
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if attrs["op"] != "create" and "id" not in attrs:
+            raise serializers.ValidationError(
+                {"id": "This field is required."}
+            )
+        if attrs["op"] != "delete" and "data" not in attrs:
+            raise serializers.ValidationError(
+                {"data": "This field is required."}
+            )
+        return attrs
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
+    image = BoundedImageField()
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ["id", "image"]
+        fields = ["id", "image", "image_variants"]
         read_only_fields = [
             "id",
         ]
-        extra_kwargs = {
-            "image": {
-                "required": True,
-            }
-        }
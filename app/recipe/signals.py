@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+from core.models import Ingredient, Recipe, Tag
+from .cache import bump_user_version, reset_user_version
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reset_cache_version_for_new_user(sender, instance, created, **kwargs):
+    if created:
+        reset_user_version(instance.pk)
+
+
+# Any model write invalidates the owner's cached responses, whether it
+# comes from the API, the admin or a shell. Bulk writes that send no
+# signals (bulk_create, update(), COPY) bump the version themselves.
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def bump_cache_version_on_write(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
+
+
+def touch_recipes(recipes):
+    """Renew modified_at, and so the detail validators, of `recipes`"""
+    recipes.update(modified_at=timezone.now())
+
+
+# A recipe's detail embeds its tags and ingredients, so renaming or
+# deleting one changes the representation of every recipe linking it.
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_on_rename(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(instance.recipe_set.all())
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_on_delete(sender, instance, **kwargs):
+    # before the links cascade away with the instance
+    touch_recipes(instance.recipe_set.all())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipes_on_link_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action.startswith("post_"):
+            touch_recipes(Recipe.objects.filter(pk=instance.pk))
+            bump_user_version(instance.user_id)
+    elif action == "pre_clear":
+        # the cleared recipes are only known before the clear
+        touch_recipes(instance.recipe_set.all())
+    elif action in ("post_add", "post_remove"):
+        touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+        bump_user_version(instance.user_id)
+    elif action == "post_clear":
+        bump_user_version(instance.user_id)
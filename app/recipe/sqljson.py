@@ -0,0 +1,103 @@
+"""
+Recipe JSON assembled inside PostgreSQL
+"""
+
+from django.db import connection
+from core.models import Recipe
+
+NESTED_FIELDS = ("tags", "ingredients")
+# fields whose SQL takes the MEDIA_URL prefix as a parameter
+MEDIA_FIELDS = ("image", "image_variants")
+
+# {"<size>": {"<format>": name}} with every name prefixed
+VARIANTS_SQL = (
+    "COALESCE(("
+    "SELECT jsonb_object_agg(s.key, ("
+    "SELECT jsonb_object_agg(f.key, %s || f.value) "
+    "FROM jsonb_each_text(s.value) f"
+    ")) FROM jsonb_each(r.image_variants) s"
+    "), '{}'::jsonb)"
+)
+
+
+def _nested_sql(field):
+    """json_agg of {"id", "name"} for one M2M relation, ordered by id"""
+    m2m = Recipe._meta.get_field(field)
+    target = m2m.related_model._meta.db_table
+    through = m2m.m2m_db_table()
+    return (
+        "COALESCE(("
+        "SELECT json_agg(json_build_object('id', n.id, 'name', n.name) "
+        "ORDER BY n.id) "
+        f"FROM {through} link JOIN {target} n "
+        f"ON n.id = link.{m2m.m2m_reverse_name()} "
+        f"WHERE link.{m2m.m2m_column_name()} = r.id"
+        "), '[]'::json)"
+    )
+
+
+def recipe_json_sql(fields):
+    """Return a SELECT expression rendering serializer `fields` of `r`.
+
+    Produces the RecipeSerializer / RecipeDetailSerializer shape: price as
+    a fixed point string, tags/ingredients as lists and image as the
+    MEDIA_URL prefix plus the stored name, or null. Each field of
+    MEDIA_FIELDS takes the prefix as one parameter, in field order.
+    """
+    parts = []
+    for name in fields:
+        if name in NESTED_FIELDS:
+            value = _nested_sql(name)
+        elif name == "price":
+            value = "r.price::text"
+        elif name == "image":
+            value = "CASE WHEN r.image <> '' THEN %s || r.image END"
+        elif name == "image_variants":
+            value = VARIANTS_SQL
+        else:
+            value = f"r.{Recipe._meta.get_field(name).column}"
+        parts.append(f"'{name}', {value}")
+    return f"json_build_object({', '.join(parts)})::text"
+
+
+def _select(fields, where, params, media_url):
+    sql = (
+        f"SELECT {recipe_json_sql(fields)} "
+        f"FROM {Recipe._meta.db_table} r {where}"
+    )
+    media = [media_url for name in fields if name in MEDIA_FIELDS]
+    return sql, [*media, *params]
+
+
+def iter_recipe_json(fields, where, params, chunk_size=500, media_url=""):
+    """Yield one JSON text per recipe of `core_recipe r` matching `where`.
+
+    `where` is a SQL fragment (joins, WHERE and ORDER BY) appended after
+    the table. Rows are read through a server-side cursor and passed on as
+    the text PostgreSQL produced, without building Python objects.
+    """
+    sql, params = _select(fields, where, params, media_url)
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            for (text,) in rows:
+                yield text
+
+
+def page_json(fields, ids, media_url=""):
+    """Return the JSON texts of recipes `ids` in the given order"""
+    if not ids:
+        return []
+    sql, params = _select(
+        fields,
+        "JOIN unnest(%s::bigint[]) WITH ORDINALITY AS page(id, position) "
+        "ON page.id = r.id ORDER BY page.position",
+        [list(ids)],
+        media_url,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [text for (text,) in cursor.fetchall()]
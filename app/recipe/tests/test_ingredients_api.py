@@ -135,3 +135,32 @@ class PrivateTagsAPITests(TestCase):
         self.assertIn(s1.data, res.data)
         self.assertNotIn(s2.data, res.data)
         self.assertEqual(len(res.data), 1)
+
+    def test_autocomplete_ingredients(self):
+        """Test q tolerates typos and combines with assigned_only"""
+        r1 = create_recipe(user=self.user)
+        tomato = Ingredient.objects.create(user=self.user, name="Tomato")
+        Ingredient.objects.create(user=self.user, name="Tomatillo")
+        Ingredient.objects.create(user=self.user, name="Potato")
+        r1.ingredients.add(tomato)
+        res = self.client.get(ingredients_url, {"q": "tomatto"})
+        self.assertEqual(res.data[0]["name"], "Tomato")
+        self.assertNotIn("Potato", [i["name"] for i in res.data])
+        params = {"q": "toma", "assigned_only": True}
+        res = self.client.get(ingredients_url, params)
+        self.assertEqual([i["name"] for i in res.data], ["Tomato"])
+
+    def test_ingredients_with_counts(self):
+        """Test with_counts combines with assigned_only"""
+        r1 = create_recipe(user=self.user)
+        r2 = create_recipe(user=self.user)
+        ingredient = Ingredient.objects.create(user=self.user, name="Ing1")
+        Ingredient.objects.create(user=self.user, name="Ing2")
+        r1.ingredients.add(ingredient)
+        r2.ingredients.add(ingredient)
+        params = {"with_counts": "True", "assigned_only": "True"}
+        res = self.client.get(ingredients_url, params)
+        self.assertEqual(
+            res.data,
+            [{"id": ingredient.id, "name": "Ing1", "recipe_count": 2}],
+        )
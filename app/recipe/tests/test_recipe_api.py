@@ -2,19 +2,43 @@
 Tests for the Recipe APIs
 """
 
+import json
 import tempfile
+import time
 import os
-from PIL import Image
+from io import StringIO
+from unittest.mock import patch
+from PIL import Image, ImageFile
 from django.urls import reverse
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.db.models.expressions import RawSQL
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from decimal import Decimal
-from core.models import Ingredient, Recipe, Tag
+from core.models import ImageBlob, Ingredient, Recipe, RecipeDocument, Tag
 from django.contrib.auth import get_user_model
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.pagination import RecipeCursorPagination
+from recipe.cache import cache_metrics
+from recipe.documents import find_drift
+from recipe.readers import nested_prefetches
+from recipe.renderers import FastJSONRenderer
+from recipe.sqljson import page_json
+from recipe.uploads import BoundedImageUploadHandler, ImageTooLarge
+from recipe.variants import store_variants
 
 recipes_url = reverse("recipe:recipe-list")
+batch_url = reverse("recipe:recipe-batch")
+export_url = reverse("recipe:recipe-export")
+facets_url = reverse("recipe:recipe-facets")
 
 
 def recipe_detail_url(recipe_id):
@@ -80,7 +104,7 @@ class PrivateRecipeAPITests(TestCase):
         res = self.client.get(recipes_url)
         recipes = Recipe.objects.all().order_by("-id")
         seriralizer = RecipeSerializer(recipes, many=True)
-        self.assertEqual(res.data, seriralizer.data)
+        self.assertEqual(res.data["results"], seriralizer.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
     def test_recipe__limited_to_user(self):
@@ -97,7 +121,7 @@ class PrivateRecipeAPITests(TestCase):
         res = self.client.get(recipes_url)
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test the recipe detail"""
@@ -307,6 +331,49 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.tags.count(), 0)
 
+    def test_update_keeps_tags_when_omitted(self):
+        """Test updating without tags leaves existing tags untouched"""
+        tag = Tag.objects.create(name="tag1", user=self.user)
+        ingredient = Ingredient.objects.create(name="ing1", user=self.user)
+        recipe = create_recipe(self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        url = recipe_detail_url(recipe_id=recipe.id)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, {"title": "new"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+        self.assertFalse(
+            [q for q in ctx.captured_queries if "core_recipe_" in q["sql"]
+             and not q["sql"].startswith("SELECT")]
+        )
+
+    def test_update_only_writes_changed_tags(self):
+        """Test updating tags only inserts and deletes the difference"""
+        tag1 = Tag.objects.create(name="tag1", user=self.user)
+        tag2 = Tag.objects.create(name="tag2", user=self.user)
+        recipe = create_recipe(self.user)
+        recipe.tags.add(tag1, tag2)
+        url = recipe_detail_url(recipe_id=recipe.id)
+        payload = {"tags": [{"name": "tag1"}, {"name": "tag3"}]}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {t.name for t in recipe.tags.all()},
+            {"tag1", "tag3"},
+        )
+        writes = [
+            q["sql"] for q in ctx.captured_queries
+            if "core_recipe_tags" in q["sql"]
+            and not q["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(writes[0].startswith("DELETE"))
+        self.assertTrue(writes[1].startswith("INSERT"))
+        self.assertEqual(writes[1].count("), ("), 0)
+
     def test_create_recipe_with_new_ingredients(self):
         """Test Create Recipe with new ingredients"""
         payload = {
@@ -407,6 +474,43 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_create_recipe_dedupes_nested_names(self):
+        """Test repeated names in a payload map to a single row"""
+        Tag.objects.create(user=self.user, name="Dinner")
+        payload = {
+            "title": "Curry",
+            "time_minutes": 30,
+            "price": Decimal("2.50"),
+            "tags": [{"name": "Dinner"}, {"name": "Dinner"}, {"name": "Hot"}],
+            "ingredients": [{"name": "Rice"}, {"name": "Rice"}],
+        }
+        res = self.client.post(recipes_url, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(recipe.ingredients.count(), 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_recipe_nested_writes_batched(self):
+        """Test nested writes do not scale queries with item count"""
+        payload = {
+            "title": "Stew",
+            "time_minutes": 90,
+            "price": Decimal("9.00"),
+            "tags": [{"name": f"tag{i}"} for i in range(30)],
+            "ingredients": [{"name": f"ing{i}"} for i in range(30)],
+        }
+        # recipe insert, then per nested field: name upsert, name select,
+        # existing links select (add() checks them once m2m_changed has
+        # receivers), one through-table insert and the modified_at touch,
+        # then the two response reads
+        with self.assertNumQueries(13):
+            res = self.client.post(recipes_url, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 30)
+        self.assertEqual(recipe.ingredients.count(), 30)
+
     def test_recipe_filter_by_tag(self):
         """Test recipe filter by tag"""
         r1 = create_recipe(self.user, title="recipe1")
@@ -421,9 +525,9 @@ class PrivateRecipeAPITests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertIn(s2.data, res.data["results"])
+        self.assertNotIn(s3.data, res.data["results"])
 
     def test_recipe_filter_by_ingredient(self):
         """Test recipe filter by ingredient"""
@@ -439,16 +543,305 @@ class PrivateRecipeAPITests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertIn(s2.data, res.data["results"])
+        self.assertNotIn(s3.data, res.data["results"])
 
+    def test_recipe_filter_match_all(self):
+        """Test match=all only returns recipes having every id"""
+        tag1 = Tag.objects.create(name="tag1", user=self.user)
+        tag2 = Tag.objects.create(name="tag2", user=self.user)
+        r1 = create_recipe(self.user, title="both")
+        r2 = create_recipe(self.user, title="one")
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+        params = {"tags": f"{tag1.id},{tag2.id}", "match": "all"}
+        res = self.client.get(recipes_url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data["results"]], [r1.id])
+
+    def test_recipe_filter_combines_tags_and_ingredients(self):
+        """Test tag and ingredient filters both apply without duplicates"""
+        tag1 = Tag.objects.create(name="tag1", user=self.user)
+        tag2 = Tag.objects.create(name="tag2", user=self.user)
+        ing = Ingredient.objects.create(name="ing1", user=self.user)
+        r1 = create_recipe(self.user, title="match")
+        r2 = create_recipe(self.user, title="no ingredient")
+        r1.tags.add(tag1, tag2)
+        r1.ingredients.add(ing)
+        r2.tags.add(tag1)
+        params = {"tags": f"{tag1.id},{tag2.id}", "ingredients": f"{ing.id}"}
+        res = self.client.get(recipes_url, params)
+        self.assertEqual([r["id"] for r in res.data["results"]], [r1.id])
+
+    def test_recipe_filter_invalid_ids(self):
+        """Test malformed filter ids are rejected with 400"""
+        for params in (
+            {"tags": "1,abc"},
+            {"ingredients": ","},
+            {"tags": "1", "match": "some"},
+        ):
+            res = self.client.get(recipes_url, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipe_filter_id_list_capped(self):
+        """Test too many filter ids are rejected"""
+        params = {"tags": ",".join(str(i) for i in range(1, 102))}
+        res = self.client.get(recipes_url, params)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", res.data)
+
+    def test_recipe_search(self):
+        """Test search matches title and description words"""
+        r1 = create_recipe(self.user, title="Spicy curry", description="x")
+        r2 = create_recipe(self.user, title="Rice", description="Mild curries")
+        create_recipe(self.user, title="Pancakes", description="Sweet")
+        res = self.client.get(recipes_url, {"search": "curry"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # title matches rank above description matches
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            [r1.id, r2.id],
+        )
+
+    def test_recipe_search_tracks_updates(self):
+        """Test the search vector follows title changes"""
+        recipe = create_recipe(self.user, title="Soup")
+        res = self.client.patch(
+            recipe_detail_url(recipe.id),
+            {"title": "Tomato stew"},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(recipes_url, {"search": "stew"})
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipe.id])
+        res = self.client.get(recipes_url, {"search": "soup"})
+        self.assertEqual(res.data["results"], [])
+
+    def test_recipe_search_with_filter_and_pagination(self):
+        """Test search combines with tag filters and cursor pages"""
+        tag = Tag.objects.create(name="tag1", user=self.user)
+        matches = []
+        for i in range(3):
+            recipe = create_recipe(self.user, title=f"Bean salad {i}")
+            recipe.tags.add(tag)
+            matches.append(recipe)
+        create_recipe(self.user, title="Bean soup")
+        params = {"search": "bean", "tags": f"{tag.id}", "page_size": 2}
+        res = self.client.get(recipes_url, params)
+        ids = [r["id"] for r in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        ids.extend(r["id"] for r in res.data["results"])
+        self.assertEqual(ids, [r.id for r in reversed(matches)])
+        self.assertIsNone(res.data["next"])
+
+    def test_recipe_search_pages_through_tied_ranks(self):
+        """Test cursor pages over many equal ranks end with every match once"""
+        matches = [
+            create_recipe(
+                self.user,
+                title=f"Chicken {'curry' if i % 3 else 'soup'}",
+                description="chicken" if i % 4 else "rice",
+            )
+            for i in range(40)
+        ]
+        create_recipe(self.user, title="Pancakes")
+
+        seen = []
+        next_url = f"{recipes_url}?search=chicken&page_size=7"
+        while next_url and len(seen) <= len(matches):
+            res = self.client.get(next_url)
+            seen.extend(r["id"] for r in res.data["results"])
+            next_url = res.data["next"]
+
+        self.assertIsNone(next_url)
+        self.assertEqual(sorted(seen), sorted(r.id for r in matches))
+
+    def test_recipe_list_paginated_by_cursor(self):
+        """Test recipe list is split into pages with a next cursor"""
+        recipes = [create_recipe(self.user) for _ in range(5)]
+        res = self.client.get(recipes_url, {"page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            [recipes[4].id, recipes[3].id],
+        )
+        self.assertIsNone(res.data["previous"])
+        self.assertIsNotNone(res.data["next"])
+
+        seen = []
+        next_url = recipes_url + "?page_size=2"
+        while next_url:
+            res = self.client.get(next_url)
+            seen.extend(r["id"] for r in res.data["results"])
+            next_url = res.data["next"]
+        self.assertEqual(seen, [r.id for r in reversed(recipes)])
+
+    def test_recipe_page_size_capped(self):
+        """Test page size can not exceed the configured maximum"""
+        for _ in range(3):
+            create_recipe(self.user)
+        with patch.object(RecipeCursorPagination, "max_page_size", 2):
+            res = self.client.get(recipes_url, {"page_size": 100})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNotNone(res.data["next"])
+
+    def test_recipe_pagination_with_filter(self):
+        """Test cursor pagination combined with tag filter"""
+        tag = Tag.objects.create(name="tag1", user=self.user)
+        tagged = []
+        for i in range(3):
+            recipe = create_recipe(self.user, title=f"recipe{i}")
+            recipe.tags.add(tag)
+            tagged.append(recipe)
+        create_recipe(self.user, title="untagged")
+        params = {"tags": f"{tag.id}", "page_size": 2}
+        res = self.client.get(recipes_url, params)
+        ids = [r["id"] for r in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        ids.extend(r["id"] for r in res.data["results"])
+        self.assertEqual(ids, [r.id for r in reversed(tagged)])
+        self.assertIsNone(res.data["next"])
+
+
+class RecipeFacetsAPITests(TestCase):
+    """Tests for tag and ingredient facet counts"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.vegan = Tag.objects.create(user=self.user, name="Vegan")
+        self.quick = Tag.objects.create(user=self.user, name="Quick")
+        self.rice = Ingredient.objects.create(user=self.user, name="Rice")
+        r1 = create_recipe(self.user, title="Rice bowl")
+        r1.tags.add(self.vegan, self.quick)
+        r1.ingredients.add(self.rice)
+        r2 = create_recipe(self.user, title="Fried rice")
+        r2.tags.add(self.vegan)
+        r2.ingredients.add(self.rice)
+        create_recipe(self.user, title="Steak").tags.add(self.quick)
+
+    def test_facets_for_all_recipes(self):
+        """Test counts cover every recipe of the user in one query"""
+        with self.assertNumQueries(1):
+            res = self.client.get(facets_url)
+        self.assertEqual(
+            res.data["tags"],
+            [
+                {"id": self.quick.id, "name": "Quick", "count": 2},
+                {"id": self.vegan.id, "name": "Vegan", "count": 2},
+            ],
+        )
+        self.assertEqual(
+            res.data["ingredients"],
+            [{"id": self.rice.id, "name": "Rice", "count": 2}],
+        )
+
+    def test_facets_follow_filters(self):
+        """Test counts only cover recipes matching the list filters"""
+        res = self.client.get(facets_url, {"tags": self.vegan.id})
+        self.assertEqual(
+            {t["name"]: t["count"] for t in res.data["tags"]},
+            {"Vegan": 2, "Quick": 1},
+        )
+        params = {"tags": f"{self.vegan.id},{self.quick.id}", "match": "all"}
+        res = self.client.get(facets_url, params)
+        self.assertEqual(res.data["ingredients"][0]["count"], 1)
+        res = self.client.get(facets_url, {"search": "steak"})
+        self.assertEqual(res.data["tags"][0]["name"], "Quick")
+        self.assertEqual(res.data["ingredients"], [])
+
+    def test_facets_cached_until_write(self):
+        """Test facets are cached and invalidated by recipe writes"""
+        self.client.get(facets_url)
+        with self.assertNumQueries(0):
+            res = self.client.get(facets_url)
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.client.post(
+            recipes_url,
+            {"title": "Salad", "tags": [{"name": "Vegan"}]},
+            format="json",
+        )
+        res = self.client.get(facets_url)
+        self.assertEqual(
+            res.data["tags"][0],
+            {"id": self.vegan.id, "name": "Vegan", "count": 3},
+        )
 
-class ImageUplaodTests(TestCase):
-    """Tests for uploading  recipe image"""
+
+class RecipeQueryBudgetTests(TestCase):
+    """Read endpoints run a fixed number of queries regardless of size"""
+
+    # list: recipes page joined to their documents
+    LIST_QUERY_BUDGET = 1
+    # detail: modified_at validator + document lookup
+    DETAIL_QUERY_BUDGET = 2
 
     def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
         self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create_recipes(self, count):
+        """Create recipes each with a couple of tags and ingredients"""
+        recipes = []
+        for i in range(count):
+            recipe = create_recipe(self.user, title=f"recipe{i}")
+            for j in range(2):
+                recipe.tags.add(
+                    Tag.objects.create(user=self.user, name=f"t{recipe.id}-{j}")
+                )
+                recipe.ingredients.add(
+                    Ingredient.objects.create(
+                        user=self.user,
+                        name=f"i{recipe.id}-{j}",
+                    )
+                )
+            recipes.append(recipe)
+        return recipes
+
+    def test_list_query_budget(self):
+        """Test recipe list query count does not grow with recipes"""
+        for count in (1, 10):
+            self._create_recipes(count)
+            with self.assertNumQueries(self.LIST_QUERY_BUDGET):
+                res = self.client.get(recipes_url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertTrue(res.data["results"][0]["tags"])
+
+    def test_filtered_list_query_budget(self):
+        """Test filtered recipe list stays within the query budget"""
+        recipes = self._create_recipes(5)
+        tag_ids = ",".join(str(r.tags.first().id) for r in recipes)
+        with self.assertNumQueries(self.LIST_QUERY_BUDGET):
+            res = self.client.get(recipes_url, {"tags": tag_ids})
+        self.assertEqual(len(res.data["results"]), 5)
+
+    def test_detail_query_budget(self):
+        """Test recipe detail stays within the query budget"""
+        recipe = self._create_recipes(1)[0]
+        with self.assertNumQueries(self.DETAIL_QUERY_BUDGET):
+            res = self.client.get(recipe_detail_url(recipe.id))
+        self.assertEqual(len(res.data["ingredients"]), 2)
+
+
+class RecipeListReadPathTests(TestCase):
+    """Tests the values() list path matches RecipeSerializer output"""
+
+    def setUp(self):
         self.user = get_user_model().objects.create_user(
             email="test@example.com",
             password="testpassword",
@@ -456,29 +849,1316 @@ class ImageUplaodTests(TestCase):
             last_name="lastname",
             username="testuser",
         )
+        self.client = APIClient()
         self.client.force_authenticate(user=self.user)
-        self.recipe = create_recipe(user=self.user)
 
-    def tearDown(self):
-        return self.recipe.image.delete()
+    def test_list_matches_serializer_bytes(self):
+        """Test the list body is byte identical to the serializer path"""
+        r1 = create_recipe(
+            self.user,
+            title="Crème brûlée \u2028",
+            price=Decimal("7"),
+        )
+        r1.tags.add(
+            Tag.objects.create(user=self.user, name="Zesty"),
+            Tag.objects.create(user=self.user, name="Açaí"),
+        )
+        r1.ingredients.add(Ingredient.objects.create(user=self.user, name="Egg"))
+        create_recipe(self.user, title=None, link=None, price=Decimal("0.5"))
+
+        res = self.client.get(recipes_url, HTTP_ACCEPT="application/json")
+
+        recipes = Recipe.objects.filter(user=self.user).order_by("-id")
+        expected = RecipeSerializer(
+            recipes.prefetch_related(*nested_prefetches()),
+            many=True,
+        ).data
+        self.assertEqual(res.data["results"], expected)
+        self.assertEqual(
+            res.content,
+            JSONRenderer().render(
+                {"next": None, "previous": None, "results": expected}
+            ),
+        )
+
+    def test_fast_renderer_matches_stock_renderer(self):
+        """Test FastJSONRenderer bytes equal JSONRenderer bytes"""
+        data = {
+            "text": "é \u2028 \u2029 \x00 \"/\\ \U0001f600",
+            "price": Decimal("1.50"),
+            "nested": [{"id": 1, "name": None}, True, False],
+        }
+        self.assertEqual(
+            FastJSONRenderer().render(data),
+            JSONRenderer().render(data),
+        )
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+
+
+class RecipeSparseFieldsTests(TestCase):
+    """Tests ?fields= and ?exclude= on recipe reads"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(self.user, title="Soup", price=Decimal("3"))
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Hot"))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Salt")
+        )
+
+    def test_list_fields(self):
+        """Test ?fields= returns only those keys from one query"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(recipes_url, {"fields": "title,id"})
 
-    def test_upload_image(self):
-        """Test uploading image to recipe"""
-        url = image_upload_url(recipe_id=self.recipe.id)
-        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
-            img = Image.new("RGB", (10, 10))
-            img.save(image_file, format="JPEG")
-            image_file.seek(0)
-            payload = {"image": image_file}
-            res = self.client.post(url, payload, format="multipart")
-        self.recipe.refresh_from_db()
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn("image", res.data)
-        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(
+            res.data["results"],
+            [{"id": self.recipe.id, "title": "Soup"}],
+        )
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertNotIn("core_recipedocument", sql)
+        self.assertNotIn('"price"', sql)
 
-    def test_upload_bad_image(self):
-        """Test uploading bad image"""
-        url = image_upload_url(recipe_id=self.recipe.id)
-        payload = {"image": "notanimage"}
-        res = self.client.post(url, payload, format="multipart")
+    def test_list_fields_queries_only_requested_relation(self):
+        """Test nested lists are fetched only when asked for"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(recipes_url, {"fields": "id,tags"})
+
+        self.assertEqual(
+            res.data["results"][0]["tags"],
+            [{"id": self.recipe.tags.get().id, "name": "Hot"}],
+        )
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertFalse(
+            any(
+                "recipe_ingredients" in query["sql"]
+                for query in ctx.captured_queries
+            )
+        )
+
+    def test_list_exclude(self):
+        """Test ?exclude= drops fields and keeps serializer order"""
+        res = self.client.get(recipes_url, {"exclude": "tags,ingredients"})
+
+        fields = [
+            name
+            for name in RecipeSerializer.Meta.fields
+            if name not in ("tags", "ingredients")
+        ]
+        self.assertEqual(list(res.data["results"][0]), fields)
+        self.assertEqual(res.data["results"][0]["price"], "3.00")
+
+    def test_list_all_fields_matches_full_response(self):
+        """Test selecting every field gives the regular payload"""
+        full = self.client.get(recipes_url)
+        res = self.client.get(
+            recipes_url,
+            {"fields": ",".join(RecipeSerializer.Meta.fields)},
+        )
+
+        self.assertEqual(res.data, full.data)
+
+    def test_detail_fields(self):
+        """Test sparse detail, including the image URL"""
+        self.recipe.image = "uploads/recipe/soup.jpg"
+        self.recipe.save()
+
+        res = self.client.get(
+            recipe_detail_url(self.recipe.id),
+            {"fields": "image,description,ingredients"},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(res.data),
+            ["ingredients", "description", "image"],
+        )
+        full = self.client.get(recipe_detail_url(self.recipe.id))
+        self.assertEqual(res.data["image"], full.data["image"])
+        self.assertTrue(res.data["image"].startswith("http://testserver/"))
+
+    def test_detail_fields_of_other_user_not_found(self):
+        """Test sparse detail still hides other users' recipes"""
+        other = get_user_model().objects.create_user(
+            email="other@example.com",
+            password="testpassword",
+            first_name="other",
+            last_name="user",
+            username="otheruser",
+        )
+        recipe = create_recipe(other)
+
+        res = self.client.get(recipe_detail_url(recipe.id), {"fields": "id"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_field_rejected(self):
+        """Test unknown or empty selections return 400"""
+        for params in (
+            {"fields": "id,secret"},
+            {"exclude": "user"},
+            {"fields": "id", "exclude": "id"},
+        ):
+            res = self.client.get(recipes_url, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fields_with_sql_render(self):
+        """Test ?render=sql honours the sparse fieldset"""
+        res = self.client.get(
+            recipes_url,
+            {"fields": "id,price,tags", "render": "sql"},
+        )
+        data = json.loads(b"".join(res.streaming_content))
+
+        self.assertEqual(
+            data["results"],
+            [
+                {
+                    "id": self.recipe.id,
+                    "price": "3.00",
+                    "tags": [{"id": self.recipe.tags.get().id, "name": "Hot"}],
+                }
+            ],
+        )
+
+
+class RecipeSQLRenderTests(TestCase):
+    """Tests the ?render=sql list and export match the serializers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipes = [
+            create_recipe(self.user, title='Spicy "curry" \u00e9', price="3.5"),
+            create_recipe(self.user, title=None, link=None, description=None),
+            create_recipe(self.user, title="Lemon cake"),
+        ]
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ("b", "a")
+        ]
+        self.recipes[0].tags.add(*tags)
+        self.recipes[0].ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Rice")
+        )
+        Recipe.objects.filter(id=self.recipes[2].id).update(
+            image="uploads/recipe/x.jpg",
+            image_variants={
+                "200": {
+                    "jpeg": "uploads/recipe/variants/x-200.jpg",
+                    "webp": "uploads/recipe/variants/x-200.webp",
+                },
+                "1200": {"webp": "uploads/recipe/variants/x-1200.webp"},
+            },
+        )
+
+    def _get(self, url, params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b"".join(res.streaming_content).decode()
+
+    def test_page_json_accepts_bigint_ids(self):
+        """Test ids past the integer range are looked up, not cast errors"""
+        ids = [self.recipes[0].id, 2**31 + 1]
+
+        texts = page_json(RecipeSerializer.Meta.fields, ids)
+
+        self.assertEqual(
+            [json.loads(text)["id"] for text in texts],
+            [self.recipes[0].id],
+        )
+
+    def test_list_matches_serializer_output(self):
+        """Test paginated, filtered and searched lists match"""
+        for params in (
+            {"page_size": 2},
+            {"tags": str(self.recipes[0].tags.first().id)},
+            {"search": "curry"},
+        ):
+            expected = self.client.get(recipes_url, params).json()
+            body = self._get(recipes_url, {**params, "render": "sql"})
+            self.assertEqual(json.loads(body)["results"], expected["results"])
+
+    def test_list_sql_follows_cursor(self):
+        """Test the next link of a SQL rendered page keeps working"""
+        body = self._get(recipes_url, {"page_size": 2, "render": "sql"})
+        next_url = json.loads(body)["next"]
+        self.assertIn("render=sql", next_url)
+        res = self.client.get(next_url)
+        page = b"".join(res.streaming_content)
+        self.assertEqual(
+            [r["id"] for r in json.loads(page)["results"]],
+            [self.recipes[0].id],
+        )
+
+    def test_export_matches_serializer_output(self):
+        """Test the SQL export matches the serializer export line by line"""
+        expected = self._get(export_url, {}).splitlines()
+        lines = self._get(export_url, {"render": "sql"}).splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [json.loads(line) for line in expected],
+        )
+        self.assertTrue(json.loads(lines[2])["image"].startswith("http://"))
+        self.assertTrue(
+            json.loads(lines[2])["image_variants"]["200"]["webp"].startswith(
+                "http://"
+            )
+        )
+
+    def test_invalid_render(self):
+        """Test an unknown render mode is rejected"""
+        res = self.client.get(recipes_url, {"render": "xml"})
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeDocumentTests(TestCase):
+    """Tests the RecipeDocument read model follows every write"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertInSync(self):
+        self.assertEqual(list(find_drift(Recipe.objects.all())), [])
+
+    def test_document_follows_api_writes(self):
+        """Test creates, nested updates, renames and deletes are mirrored"""
+        res = self.client.post(
+            recipes_url,
+            {"title": "Soup", "tags": [{"name": "Hot"}]},
+            format="json",
+        )
+        recipe_id = res.data["id"]
+        document = RecipeDocument.objects.get(recipe_id=recipe_id)
+        self.assertEqual(document.data["tags"][0]["name"], "Hot")
+
+        self.client.patch(
+            recipe_detail_url(recipe_id),
+            {"ingredients": [{"name": "Leek"}], "tags": []},
+            format="json",
+        )
+        self.assertInSync()
+        tag = Tag.objects.get(name="Hot")
+        Recipe.objects.get(id=recipe_id).tags.add(tag)
+        self.client.patch(
+            reverse("recipe:tag-detail", args=[tag.id]),
+            {"name": "Spicy"},
+        )
+        document.refresh_from_db()
+        self.assertEqual(document.data["tags"], [{"id": tag.id, "name": "Spicy"}])
+
+        self.client.delete(recipe_detail_url(recipe_id))
+        self.assertFalse(RecipeDocument.objects.exists())
+
+    def test_document_follows_bulk_sql(self):
+        """Test queryset updates and bulk inserts are mirrored too"""
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(user=self.user, title=f"r{i}") for i in range(3)]
+        )
+        Recipe.tags.through.objects.bulk_create(
+            [
+                Recipe.tags.through(
+                    recipe_id=recipe.id,
+                    tag_id=Tag.objects.create(user=self.user, name=f"t{i}").id,
+                )
+                for i, recipe in enumerate(recipes)
+            ]
+        )
+        Recipe.objects.filter(user=self.user).update(price=Decimal("9.5"))
+        Tag.objects.filter(user=self.user).update(name=Concat("name", Value("!")))
+        self.assertInSync()
+        self.assertEqual(
+            RecipeDocument.objects.get(recipe_id=recipes[0].id).data["price"],
+            "9.50",
+        )
+
+    def test_reads_served_from_documents(self):
+        """Test list and detail return the stored document payload"""
+        recipe = create_recipe(self.user, title="Soup")
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Hot"))
+        RecipeDocument.objects.filter(recipe=recipe).update(
+            data=RawSQL(
+                "data || '{\"title\": \"from document\"}'::jsonb", []
+            )
+        )
+        res = self.client.get(recipes_url)
+        self.assertEqual(res.data["results"][0]["title"], "from document")
+        self.assertEqual(res.data["results"][0]["tags"][0]["name"], "Hot")
+        res = self.client.get(recipe_detail_url(recipe.id))
+        self.assertEqual(res.data["title"], "from document")
+
+    def test_reads_fall_back_without_document(self):
+        """Test recipes missing a document are still served"""
+        recipe = create_recipe(self.user, title="Soup")
+        RecipeDocument.objects.all().delete()
+        res = self.client.get(recipes_url)
+        self.assertEqual(res.data["results"][0]["title"], "Soup")
+        res = self.client.get(recipe_detail_url(recipe.id))
+        self.assertEqual(res.data, RecipeDetailSerializer(recipe).data)
+
+    def test_reads_fall_back_for_documents_missing_fields(self):
+        """Test documents rendered before a field existed are not served"""
+        recipe = create_recipe(self.user, title="Soup")
+        RecipeDocument.objects.filter(recipe=recipe).update(
+            data=RawSQL("data - 'image_variants'", [])
+        )
+        res = self.client.get(recipes_url)
+        self.assertEqual(res.data["results"][0]["title"], "Soup")
+        res = self.client.get(recipe_detail_url(recipe.id))
+        self.assertEqual(res.data, RecipeDetailSerializer(recipe).data)
+        self.assertEqual(
+            list(find_drift(Recipe.objects.all())),
+            [(recipe.id, "stale")],
+        )
+
+        call_command("rebuild_recipe_documents", stdout=StringIO())
+
+        self.assertIn(
+            "image_variants",
+            RecipeDocument.objects.get(recipe=recipe).data,
+        )
+
+
+class RecipeResponseCacheTests(TestCase):
+    """Tests for the per-user versioned response cache"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        """Test a repeated read hits the cache without touching the DB"""
+        create_recipe(self.user)
+        before = cache_metrics()
+        res = self.client.get(recipes_url, {"page_size": 5, "tags": ""})
+        self.assertEqual(res["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            cached = self.client.get(recipes_url, {"tags": "", "page_size": 5})
+        self.assertEqual(cached["X-Cache"], "HIT")
+        self.assertEqual(cached.data, res.data)
+        after = cache_metrics()
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+
+    def test_orm_writes_invalidate_cache(self):
+        """Test writes outside the API (admin, shell) bump the version too"""
+        recipe = create_recipe(self.user, title="first")
+        tag = Tag.objects.create(user=self.user, name="Hot")
+        writes = [
+            lambda: Recipe.objects.filter(pk=recipe.pk).first().save(),
+            lambda: recipe.tags.add(tag),
+            lambda: Tag.objects.get(pk=tag.pk).save(),
+            lambda: recipe.tags.remove(tag),
+            lambda: create_recipe(self.user, title="second").delete(),
+        ]
+        for index, write in enumerate(writes):
+            self.client.get(recipes_url)
+            self.assertEqual(self.client.get(recipes_url)["X-Cache"], "HIT")
+
+            write()
+
+            res = self.client.get(recipes_url)
+            self.assertEqual(res["X-Cache"], "MISS", index)
+
+    def test_api_writes_invalidate_cache(self):
+        """Test creates, updates and deletes bump the user's version"""
+        recipe = create_recipe(self.user, title="first")
+        self.client.get(recipes_url)
+        self.client.get(recipe_detail_url(recipe.id))
+
+        self.client.post(recipes_url, {"title": "second"})
+        res = self.client.get(recipes_url)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.data["results"]), 2)
+
+        self.client.patch(recipe_detail_url(recipe.id), {"title": "changed"})
+        res = self.client.get(recipe_detail_url(recipe.id))
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["title"], "changed")
+
+        self.client.delete(recipe_detail_url(recipe.id))
+        res = self.client.get(recipes_url)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_tag_list_invalidated_by_recipe_write(self):
+        """Test nested tag creation invalidates the cached tag list"""
+        tags_url = reverse("recipe:tag-list")
+        self.assertEqual(self.client.get(tags_url).data, [])
+        self.client.post(
+            recipes_url,
+            {"title": "r", "tags": [{"name": "New"}]},
+            format="json",
+        )
+        res = self.client.get(tags_url)
+        self.assertEqual([t["name"] for t in res.data], ["New"])
+
+    def test_cache_is_per_user(self):
+        """Test cached responses are never shared between users"""
+        other_user = get_user_model().objects.create_user(
+            email="test2@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="test2user",
+        )
+        create_recipe(self.user)
+        self.client.get(recipes_url)
+        self.client.force_authenticate(user=other_user)
+        res = self.client.get(recipes_url)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"], [])
+
+
+class RecipeConditionalGetTests(TestCase):
+    """Tests for ETag / Last-Modified handling on recipe reads"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match on the list returns 304"""
+        create_recipe(self.user)
+        res = self.client.get(recipes_url)
+        etag = res["ETag"]
+        with self.assertNumQueries(0):
+            res = self.client.get(recipes_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertFalse(res.content)
+
+    def test_list_etag_changes_on_write(self):
+        """Test the list validator changes after a write"""
+        res = self.client.get(recipes_url)
+        self.client.post(recipes_url, {"title": "new"})
+        res = self.client.get(recipes_url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_list_etag_depends_on_query(self):
+        """Test different pages do not share a validator"""
+        res = self.client.get(recipes_url)
+        res = self.client.get(
+            recipes_url,
+            {"page_size": 1},
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_detail_not_modified(self):
+        """Test detail honours If-None-Match and If-Modified-Since"""
+        recipe = create_recipe(self.user)
+        url = recipe_detail_url(recipe.id)
+        res = self.client.get(url)
+        self.assertIn("Last-Modified", res)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(
+                url,
+                HTTP_IF_NONE_MATCH=res["ETag"],
+            )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        not_modified = self.client.get(
+            url,
+            HTTP_IF_MODIFIED_SINCE=res["Last-Modified"],
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_survives_unrelated_writes(self):
+        """Test a detail validator ignores changes to other recipes"""
+        recipe = create_recipe(self.user)
+        url = recipe_detail_url(recipe.id)
+        etag = self.client.get(url)["ETag"]
+        self.client.post(recipes_url, {"title": "other"})
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_modified_by_update(self):
+        """Test updating the recipe or a linked tag renews its validator"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+        url = recipe_detail_url(recipe.id)
+
+        etag = self.client.get(url)["ETag"]
+        self.client.patch(url, {"title": "changed"})
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "changed")
+
+        etag = res["ETag"]
+        self.client.patch(
+            reverse("recipe:tag-detail", args=[tag.id]),
+            {"name": "Vegetarian"},
+        )
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["tags"][0]["name"], "Vegetarian")
+
+    def test_detail_and_list_modified_by_orm_writes(self):
+        """Test writes outside the API renew validators and cached bodies"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        url = recipe_detail_url(recipe.id)
+        detail = self.client.get(url)
+        listing = self.client.get(recipes_url)
+
+        # as the admin saves
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        recipe.title = "admin edit"
+        recipe.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=detail["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "admin edit")
+        self.assertNotEqual(res["ETag"], detail["ETag"])
+        res = self.client.get(recipes_url, HTTP_IF_NONE_MATCH=listing["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["title"], "admin edit")
+
+        detail = self.client.get(url)
+        recipe.tags.add(tag)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=detail["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["tags"][0]["name"], "Vegan")
+
+        detail = self.client.get(url)
+        tag.name = "Vegetarian"
+        tag.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=detail["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["tags"][0]["name"], "Vegetarian")
+
+        # update() sends no signals, the body follows modified_at anyway
+        detail = self.client.get(url)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            title="bulk edit",
+            modified_at=timezone.now(),
+        )
+        res = self.client.get(url)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["title"], "bulk edit")
+        self.assertNotEqual(res["ETag"], detail["ETag"])
+
+    def test_detail_other_users_recipe_not_found(self):
+        """Test a conditional GET does not leak other users' recipes"""
+        other_user = get_user_model().objects.create_user(
+            email="test2@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="test2user",
+        )
+        recipe = create_recipe(other_user)
+        res = self.client.get(recipe_detail_url(recipe.id), HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeBatchAPITests(TestCase):
+    """Tests for the recipe batch endpoint"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_batch_mixed_operations(self):
+        """Test creates, updates and deletes are applied with results"""
+        to_update = create_recipe(self.user, title="old")
+        to_delete = create_recipe(self.user)
+        payload = [
+            {
+                "op": "create",
+                "data": {
+                    "title": "new",
+                    "time_minutes": 3,
+                    "price": "1.50",
+                    "tags": [{"name": "Quick"}],
+                },
+            },
+            {"op": "update", "id": to_update.id, "data": {"title": "renamed"}},
+            {"op": "delete", "id": to_delete.id},
+        ]
+        res = self.client.post(batch_url, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data["results"]
+        self.assertEqual(
+            [r["status"] for r in results],
+            [
+                status.HTTP_201_CREATED,
+                status.HTTP_200_OK,
+                status.HTTP_204_NO_CONTENT,
+            ],
+        )
+        created = Recipe.objects.get(id=results[0]["data"]["id"])
+        self.assertEqual(created.user, self.user)
+        self.assertEqual([t.name for t in created.tags.all()], ["Quick"])
+        self.assertEqual(results[0]["data"]["tags"][0]["name"], "Quick")
+        to_update.refresh_from_db()
+        self.assertEqual(to_update.title, "renamed")
+        self.assertFalse(Recipe.objects.filter(id=to_delete.id).exists())
+
+    def test_batch_invalid_item_writes_nothing(self):
+        """Test one invalid operation rejects the whole batch"""
+        recipe = create_recipe(self.user, title="keep")
+        payload = [
+            {"op": "delete", "id": recipe.id},
+            {"op": "create", "data": {"title": "x", "time_minutes": "abc"}},
+        ]
+        res = self.client.post(batch_url, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["errors"][0], {})
+        self.assertIn("time_minutes", res.data["errors"][1])
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_batch_other_users_recipe_not_found(self):
+        """Test operations can not touch another user's recipes"""
+        other_user = get_user_model().objects.create_user(
+            email="test2@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="test2user",
+        )
+        recipe = create_recipe(other_user)
+        payload = [{"op": "delete", "id": recipe.id}]
+        res = self.client.post(batch_url, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("id", res.data["errors"][0])
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+    @override_settings(RECIPE_BATCH_MAX_OPERATIONS=2)
+    def test_batch_too_many_operations_not_validated(self):
+        """Test an oversized batch is refused before validating items"""
+        payload = [{"op": "delete", "id": 1}] * 3
+        with patch(
+            "recipe.serializers.RecipeBatchOperationSerializer.validate"
+        ) as validate:
+            res = self.client.post(batch_url, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("At most 2 operations", res.data["errors"][0])
+        validate.assert_not_called()
+
+    def test_batch_creates_use_bulk_sql(self):
+        """Test batch create query count does not grow with item count"""
+        def payload(count):
+            return [
+                {
+                    "op": "create",
+                    "data": {
+                        "title": f"recipe{i}",
+                        "tags": [{"name": "Shared"}, {"name": f"tag{i}"}],
+                        "ingredients": [{"name": "Salt"}],
+                    },
+                }
+                for i in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(batch_url, payload(2), format="json")
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.post(batch_url, payload(25), format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Recipe.objects.count(), 27)
+        self.assertEqual(Tag.objects.filter(name="Shared").count(), 1)
+
+
+class RecipeExportAPITests(TestCase):
+    """Tests for the streaming recipe export"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _export(self, params=None, **headers):
+        res = self.client.get(export_url, params or {}, **headers)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        body = b"".join(res.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_export_streams_all_recipes(self):
+        """Test every recipe is exported oldest first with nested data"""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+        recipes[0].tags.add(Tag.objects.create(user=self.user, name="t1"))
+        create_recipe(
+            get_user_model().objects.create_user(
+                email="test2@example.com",
+                password="testpassword",
+                first_name="testname",
+                last_name="lastname",
+                username="test2user",
+            )
+        )
+        with patch("recipe.views.settings.RECIPE_EXPORT_CHUNK_SIZE", 2):
+            rows = self._export()
+        self.assertEqual([r["id"] for r in rows], [r.id for r in recipes])
+        self.assertEqual(rows[0]["tags"][0]["name"], "t1")
+        self.assertEqual(rows[0], RecipeDetailSerializer(recipes[0]).data)
+
+    def test_export_resumes_after_id(self):
+        """Test export can resume after a given recipe id"""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+        rows = self._export({"after": recipes[0].id})
+        self.assertEqual([r["id"] for r in rows], [r.id for r in recipes[1:]])
+
+    def test_export_invalid_after(self):
+        """Test a malformed resume id is rejected"""
+        res = self.client.get(export_url, {"after": "x"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_accepts_ndjson(self):
+        """Test clients asking for NDJSON get the stream, errors as a line"""
+        recipe = create_recipe(self.user)
+        accept = {"HTTP_ACCEPT": "application/x-ndjson"}
+
+        rows = self._export(**accept)
+
+        self.assertEqual([r["id"] for r in rows], [recipe.id])
+        res = self.client.get(export_url, {"after": "x"}, **accept)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertIn("after", json.loads(res.content))
+
+
+class ImageUplaodTests(TestCase):
+    """Tests for uploading  recipe image"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def tearDown(self):
+        return self.recipe.image.delete()
+
+    def test_upload_image(self):
+        """Test uploading image to recipe"""
+        url = image_upload_url(recipe_id=self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            img = Image.new("RGB", (10, 10))
+            img.save(image_file, format="JPEG")
+            image_file.seek(0)
+            payload = {"image": image_file}
+            res = self.client.post(url, payload, format="multipart")
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("image", res.data)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_upload_bad_image(self):
+        """Test uploading bad image"""
+        url = image_upload_url(recipe_id=self.recipe.id)
+        payload = {"image": "notanimage"}
+        res = self.client.post(url, payload, format="multipart")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeImageVariantsTests(TestCase):
+    """Tests resized image variants rendered after an upload"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media.name,
+            RECIPE_THUMBNAIL_WORKERS=0,
+        )
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def _upload(self, size=(800, 400), orientation=None):
+        image = Image.new("RGB", size, "red")
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        exif[0x010F] = "Camera maker"
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            image.save(image_file, format="JPEG", exif=exif.tobytes())
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    image_upload_url(self.recipe.id),
+                    {"image": image_file},
+                    format="multipart",
+                )
+        self.recipe.refresh_from_db()
+        return res
+
+    def test_upload_renders_variants(self):
+        """Test sizes up to the original are rendered without metadata"""
+        res = self._upload(orientation=6)
+
+        self.assertEqual(res.data["image_variants"], {})
+        variants = self.recipe.image_variants
+        self.assertEqual(list(variants), ["200", "600"])
+        self.assertEqual(set(variants["200"]), {"webp", "jpeg"})
+        storage = self.recipe.image.storage
+        with Image.open(storage.path(variants["600"]["jpeg"])) as variant:
+            # rotated per EXIF orientation, which is then dropped
+            self.assertEqual(variant.size, (300, 600))
+            self.assertEqual(dict(variant.getexif()), {})
+            self.assertNotIn("icc_profile", variant.info)
+        with Image.open(storage.path(variants["200"]["webp"])) as variant:
+            self.assertEqual(variant.format, "WEBP")
+            self.assertEqual(variant.size, (100, 200))
+
+    def test_detail_exposes_variant_urls(self):
+        """Test every read path returns the same absolute variant URLs"""
+        self._upload()
+
+        res = self.client.get(recipe_detail_url(self.recipe.id))
+
+        self.assertEqual(
+            res.data["image_variants"]["200"]["webp"],
+            "http://testserver"
+            + self.recipe.image.storage.url(
+                self.recipe.image_variants["200"]["webp"]
+            ),
+        )
+        expected = RecipeDetailSerializer(
+            self.recipe,
+            context={"request": res.wsgi_request},
+        ).data
+        self.assertEqual(res.data, expected)
+        sparse = self.client.get(
+            recipe_detail_url(self.recipe.id),
+            {"fields": "image_variants"},
+        )
+        self.assertEqual(
+            sparse.data,
+            {"image_variants": expected["image_variants"]},
+        )
+        self.assertEqual(list(find_drift(Recipe.objects.all())), [])
+
+    def test_new_image_replaces_variants(self):
+        """Test a new upload drops old variants and late results are ignored"""
+        self._upload()
+        old_name = self.recipe.image.name
+
+        self._upload(size=(100, 100))
+
+        self.assertEqual(list(self.recipe.image_variants), ["200"])
+        self.assertNotEqual(self.recipe.image.name, old_name)
+        variants = self.recipe.image_variants
+        store_variants(
+            self.recipe.id,
+            self.user.id,
+            old_name,
+            {"200": {"webp": "stale.webp"}},
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, variants)
+
+    def test_batch_image_removal_drops_variants(self):
+        """Test clearing the image in a batch update drops its variants"""
+        self._upload()
+        payload = [
+            {"op": "update", "id": self.recipe.id, "data": {"image": None}},
+        ]
+
+        res = self.client.post(batch_url, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+        self.assertEqual(self.recipe.image_variants, {})
+        res = self.client.get(recipe_detail_url(self.recipe.id))
+        self.assertEqual(res.data["image_variants"], {})
+
+
+@override_settings(RECIPE_IMAGE_MAX_BYTES=20000, RECIPE_IMAGE_MAX_PIXELS=10000)
+class RecipeImageUploadLimitsTests(TestCase):
+    """Tests image uploads are bounded before they are decoded"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def _upload(self, image, image_format="PNG", url=None):
+        suffix = f".{image_format.lower()}"
+        with tempfile.NamedTemporaryFile(suffix=suffix) as image_file:
+            image.save(image_file, format=image_format)
+            image_file.seek(0)
+            return self.client.post(
+                url or image_upload_url(self.recipe.id),
+                {"image": image_file},
+                format="multipart",
+            )
+
+    def test_upload_within_limits(self):
+        """Test a small image is accepted"""
+        res = self._upload(Image.new("RGB", (100, 100)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_too_many_pixels_rejected_without_decoding(self):
+        """Test dimensions are checked from the header alone"""
+        with patch.object(ImageFile.ImageFile, "load") as load:
+            res = self._upload(Image.new("1", (101, 100)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("at most 10000 pixels", res.data["image"][0])
+        load.assert_not_called()
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_unsupported_format_rejected(self):
+        """Test formats outside the allowed list are refused"""
+        res = self._upload(Image.new("RGB", (10, 10)), image_format="BMP")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Unsupported image format BMP", res.data["image"][0])
+
+    def test_too_many_bytes_rejected(self):
+        """Test an oversized body is refused with 413"""
+        noise = Image.effect_noise((200, 200), 100).convert("RGB")
+
+        res = self._upload(noise, image_format="BMP")
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    def test_limits_apply_to_recipe_create(self):
+        """Test images sent with a new recipe go through the same checks"""
+        res = self.client.post(
+            recipes_url,
+            {
+                "title": "Cake",
+                "time_minutes": 5,
+                "price": "1.00",
+                "image": self._image_file(Image.new("1", (200, 200))),
+            },
+            format="multipart",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", res.data)
+
+    def test_server_paths_rejected_unopened(self):
+        """Test an image given as a string is refused without opening it"""
+        existing = self._image_file(Image.new("1", (200, 200)))
+        payload = {"title": "Cake", "time_minutes": 5, "price": "1.00"}
+
+        with patch("recipe.serializers.check_image_header") as check:
+            responses = [
+                self.client.post(
+                    recipes_url,
+                    {**payload, "image": path},
+                    format="json",
+                )
+                for path in (existing.name, f"{existing.name}.missing")
+            ]
+
+        check.assert_not_called()
+        for res in responses:
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(responses[0].data, responses[1].data)
+
+    def _image_file(self, image):
+        image_file = tempfile.NamedTemporaryFile(suffix=".png")
+        self.addCleanup(image_file.close)
+        image.save(image_file, format="PNG")
+        image_file.seek(0)
+        return image_file
+
+    def test_handler_rejects_while_streaming(self):
+        """Test the handler fails on the first chunk past a limit"""
+        handler = BoundedImageUploadHandler()
+        handler.new_file("image", "a.png", "image/png", None)
+        with self.assertRaises(ImageTooLarge):
+            handler.receive_data_chunk(b"x" * 20001, 0)
+
+        header = tempfile.TemporaryFile()
+        Image.new("1", (500, 500)).save(header, format="PNG")
+        header.seek(0)
+        handler = BoundedImageUploadHandler()
+        handler.new_file("image", "b.png", "image/png", None)
+        with self.assertRaises(ValidationError) as ctx:
+            handler.receive_data_chunk(header.read(64), 0)
+        self.assertIn("image", ctx.exception.detail)
+
+
+class RecipeImageBlobTests(TestCase):
+    """Tests uploads are stored once per content and reference counted"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media.name,
+            RECIPE_THUMBNAIL_WORKERS=0,
+        )
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def _upload(self, recipe, color="red"):
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            Image.new("RGB", (300, 200), color).save(image_file, format="JPEG")
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    image_upload_url(recipe.id),
+                    {"image": image_file},
+                    format="multipart",
+                )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        return recipe.image.name
+
+    def test_same_content_shares_one_blob(self):
+        """Test equal uploads are stored once under their digest"""
+        first = self._upload(self.recipes[0])
+        path = os.path.join(self.media.name, first)
+        os.utime(path, (0, 0))
+        with patch("recipe.variants.render_variants") as render:
+            second = self._upload(self.recipes[1])
+
+        self.assertEqual(first, second)
+        blob = ImageBlob.objects.get()
+        self.assertEqual(first, blob.name)
+        self.assertRegex(first, r"^uploads/recipe/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertTrue(first.split("/")[-1].startswith(blob.digest))
+        self.assertEqual(blob.ref_count, 2)
+        directory = os.path.join(self.media.name, os.path.dirname(first))
+        self.assertEqual(
+            [name for name in os.listdir(directory) if name != "variants"],
+            [os.path.basename(first)],
+        )
+        # the second recipe reuses the variants rendered for the first
+        render.assert_not_called()
+        # and refreshed the files' mtime, keeping them from collection
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+        self.assertEqual(self.recipes[1].image_variants, blob.variants)
+        self.assertEqual(
+            self.recipes[1].image_variants,
+            self.recipes[0].image_variants,
+        )
+
+    def test_ref_count_follows_recipes(self):
+        """Test replacing images and deleting recipes release blobs"""
+        name = self._upload(self.recipes[0])
+        self._upload(self.recipes[1])
+        Recipe.objects.filter(id=self.recipes[2].id).update(image=name)
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 3)
+
+        other = self._upload(self.recipes[0], color="blue")
+        self.recipes[1].delete()
+        Recipe.objects.filter(id=self.recipes[2].id).update(title="Renamed")
+
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 1)
+        self.assertEqual(ImageBlob.objects.get(name=other).ref_count, 1)
+        Recipe.objects.filter(user=self.user).delete()
+        self.assertEqual(
+            list(ImageBlob.objects.values_list("ref_count", flat=True)),
+            [0, 0],
+        )
+
+
+class RecipeMediaViewTests(TestCase):
+    """Tests recipe media is served only to owners, via nginx"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media.name,
+            MEDIA_ACCEL_REDIRECT=True,
+        )
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="testpassword",
+            first_name="testname",
+            last_name="lastname",
+            username="testuser",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.image = f"uploads/recipe/ab/{'ab' * 32}.jpg"
+        self.variant = f"uploads/recipe/ab/variants/{'ab' * 32}-200.webp"
+        for name in (self.image, self.variant, "uploads/recipe/x.png"):
+            path = os.path.join(self.media.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as image_file:
+                image_file.write(b"image bytes")
+        create_recipe(self.user, image=self.image)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def _url(self, name):
+        return reverse("media", args=[name])
+
+    def test_owner_gets_accel_redirect(self):
+        """Test the app answers with headers only, nginx sends the file"""
+        res = self.client.get(self._url(self.variant))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, b"")
+        self.assertEqual(
+            res["X-Accel-Redirect"],
+            f"/protected-media/{self.variant}",
+        )
+        self.assertEqual(res["Content-Type"], "image/webp")
+        self.assertEqual(
+            res["Cache-Control"],
+            "private, max-age=31536000, immutable",
+        )
+        stat = os.stat(os.path.join(self.media.name, self.variant))
+        self.assertEqual(
+            res["ETag"],
+            f'"{int(stat.st_mtime):x}-{stat.st_size:x}"',
+        )
+
+    def test_revalidation_returns_304(self):
+        """Test a matching If-None-Match is answered without a transfer"""
+        etag = self.client.get(self._url(self.image))["ETag"]
+
+        res = self.client.get(self._url(self.image), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotIn("X-Accel-Redirect", res)
+
+    def test_other_users_and_anonymous_denied(self):
+        """Test files of recipes the user does not own are hidden"""
+        other = get_user_model().objects.create_user(
+            email="other@example.com",
+            password="testpassword",
+            first_name="other",
+            last_name="user",
+            username="otheruser",
+        )
+        create_recipe(other, image="uploads/recipe/x.png")
+
+        res = self.client.get(self._url("uploads/recipe/x.png"))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(self._url("uploads/recipe/../x.png"))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = APIClient().get(self._url(self.image))
+        self.assertIn(
+            res.status_code,
+            (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN),
+        )
+
+    def test_streams_without_accel_redirect(self):
+        """Test DEBUG setups get the file from Django itself"""
+        with override_settings(MEDIA_ACCEL_REDIRECT=False):
+            res = self.client.get(self._url(self.image), HTTP_ACCEPT="image/*")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(res.streaming_content), b"image bytes")
+        self.assertNotIn("X-Accel-Redirect", res)
+
+    def test_api_image_urls_point_at_the_view(self):
+        """Test serialized image URLs resolve to the media view"""
+        recipe = Recipe.objects.get(image=self.image)
+
+        res = self.client.get(recipe_detail_url(recipe.id))
+
+        self.assertTrue(res.data["image"].endswith(self._url(self.image)))
@@ -2,6 +2,7 @@
 Tests for the Recipe APIs
 """
 
+from unittest.mock import patch
 from django.urls import reverse
 from django.test import TestCase
 from .test_recipe_api import create_recipe
@@ -92,6 +93,30 @@ class PrivateTagsAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(tag.name, payload["name"])
 
+    def test_update_tag_duplicate_name(self):
+        """Renaming a tag to an existing name is rejected"""
+        Tag.objects.create(user=self.user, name="Tag1")
+        tag = Tag.objects.create(user=self.user, name="Tag2")
+        res = self.client.patch(tag_detail_url(tag_id=tag.id), {"name": "Tag1"})
+        tag.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(tag.name, "Tag2")
+
+    def test_update_tag_racing_rename(self):
+        """A rename losing a race to the same name is a 400, not a 500"""
+        Tag.objects.create(user=self.user, name="Tag1")
+        tag = Tag.objects.create(user=self.user, name="Tag2")
+        # the duplicate check passes, as if the other rename committed after
+        with patch("django.db.models.query.QuerySet.exists", return_value=False):
+            res = self.client.patch(
+                tag_detail_url(tag_id=tag.id),
+                {"name": "Tag1"},
+            )
+        tag.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("name", res.data)
+        self.assertEqual(tag.name, "Tag2")
+
     def test_delete_tag(self):
         tag = Tag.objects.create(user=self.user, name="Tag1")
         tag_url = tag_detail_url(tag_id=tag.id)
@@ -134,3 +159,52 @@ class PrivateTagsAPITests(TestCase):
         self.assertIn(s1.data, res.data)
         self.assertNotIn(s2.data, res.data)
         self.assertEqual(len(res.data), 1)
+
+    def test_autocomplete_tags(self):
+        """Test q returns prefix and fuzzy matches ranked by similarity"""
+        for name in ["Curry", "Curried rice", "Dessert", "Sweet curry"]:
+            Tag.objects.create(user=self.user, name=name)
+        res = self.client.get(tags_url, {"q": "curr"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag["name"] for tag in res.data]
+        self.assertEqual(names[0], "Curry")
+        self.assertEqual(
+            sorted(names),
+            ["Curried rice", "Curry", "Sweet curry"],
+        )
+
+    def test_autocomplete_tags_limit(self):
+        """Test autocomplete honours the limit and user isolation"""
+        other_user = create_user(
+            email="Test@ddsdds.com",
+            username="ussername2",
+        )
+        Tag.objects.create(user=other_user, name="Pasta")
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f"Pasta {i}")
+        res = self.client.get(tags_url, {"q": "pas", "limit": 2})
+        self.assertEqual(len(res.data), 2)
+        self.assertTrue(all(t["name"].startswith("Pasta ") for t in res.data))
+        res = self.client.get(tags_url, {"q": "p"})
+        self.assertEqual(len(res.data), 5)
+        res = self.client.get(tags_url, {"q": "pas", "limit": "x"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tags_with_counts(self):
+        """Test with_counts adds the number of recipes per tag"""
+        r1 = create_recipe(user=self.user)
+        r2 = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name="Tag1")
+        tag2 = Tag.objects.create(user=self.user, name="Tag2")
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+        Tag.objects.create(user=self.user, name="Tag3")
+        res = self.client.get(tags_url, {"with_counts": "true"})
+        self.assertEqual(
+            {tag["name"]: tag["recipe_count"] for tag in res.data},
+            {"Tag1": 2, "Tag2": 1, "Tag3": 0},
+        )
+        res = self.client.get(tags_url, {"with_counts": "true", "q": "tag1"})
+        self.assertEqual(res.data[0]["recipe_count"], 2)
+        res = self.client.get(tags_url)
+        self.assertNotIn("recipe_count", res.data[0])
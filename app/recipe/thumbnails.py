@@ -0,0 +1,88 @@
+"""
+Resized recipe image variants rendered with Pillow
+
+Only Pillow is imported here: render_variants runs in worker processes
+and must not need Django set up.
+"""
+
+import io
+import os
+from PIL import Image, ImageOps
+
+try:
+    from PIL import ImageCms
+except ImportError:  # Pillow built without littlecms
+    ImageCms = None
+
+VARIANT_SIZES = (200, 600, 1200)
+# format key -> (file extension, Pillow format, save options)
+VARIANT_FORMATS = {
+    "webp": ("webp", "WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", "JPEG", {"quality": 82, "optimize": True}),
+}
+
+
+def render_variants(source, target_dir, stem, sizes=VARIANT_SIZES):
+    """Write downscaled copies of image file `source` into `target_dir`.
+
+    Returns {"<size>": {"<format>": file name}} with one entry per size
+    in VARIANT_SIZES whose longest edge fits the source (the smallest is
+    always written). Orientation from EXIF is applied to the pixels and
+    the files are written without EXIF, XMP or ICC data, converted to
+    sRGB first when the source carries a profile.
+    """
+    sizes = sorted(sizes, reverse=True)
+    with Image.open(source) as image:
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale, much cheaper than a
+        # full decode followed by a resize
+        image.draft("RGB", (sizes[0], sizes[0]))
+        image = ImageOps.exif_transpose(image)
+        image = _to_srgb(image)
+    longest = max(image.size)
+    variants = {}
+    for size in sizes:
+        if size > longest and size != sizes[-1]:
+            continue
+        # each size is reduced from the previous, larger one
+        image = image.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[str(size)] = {
+            key: _save(image, target_dir, f"{stem}-{size}.{ext}", *encoder)
+            for key, (ext, *encoder) in VARIANT_FORMATS.items()
+        }
+    return dict(sorted(variants.items(), key=lambda item: int(item[0])))
+
+
+def _to_srgb(image):
+    """Return `image` as RGB or RGBA pixels in the sRGB colour space"""
+    profile = image.info.get("icc_profile")
+    if profile and ImageCms is not None:
+        try:
+            image = ImageCms.profileToProfile(
+                image,
+                ImageCms.ImageCmsProfile(io.BytesIO(profile)),
+                ImageCms.createProfile("sRGB"),
+                outputMode="RGBA" if _has_alpha(image) else "RGB",
+            )
+        except (ImageCms.PyCMSError, OSError, ValueError):
+            pass
+    return image.convert("RGBA" if _has_alpha(image) else "RGB")
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def _save(image, target_dir, name, image_format, options):
+    """Encode `image` to `target_dir`/`name`, never exposing a partial file"""
+    if image_format == "JPEG" and image.mode == "RGBA":
+        flat = Image.new("RGB", image.size, "white")
+        flat.paste(image, mask=image.getchannel("A"))
+        image = flat
+    path = os.path.join(target_dir, name)
+    partial = f"{path}.{os.getpid()}.part"
+    image.save(partial, image_format, **options)
+    os.replace(partial, path)
+    return name
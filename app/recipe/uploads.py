@@ -0,0 +1,102 @@
+"""
+Bounded recipe image uploads, validated from the image header
+"""
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, UnidentifiedImageError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+# formats Pillow reports for accepted uploads (MPO: multi-picture JPEG)
+IMAGE_FORMATS = ("JPEG", "MPO", "PNG", "WEBP", "GIF")
+# headers normally fit here; later chunks are not sniffed while streaming
+HEADER_BYTES = 512 * 1024
+# room for boundaries and the other form fields of a multipart body
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class ImageTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = "image_too_large"
+
+    def __init__(self):
+        super().__init__(
+            f"Images may be at most "
+            f"{settings.RECIPE_IMAGE_MAX_BYTES // (1024 * 1024)} MB."
+        )
+
+
+def check_image_header(file):
+    """Validate format and dimensions of an image file without decoding.
+
+    Pillow only parses the header in Image.open; pixel data is never
+    read here. Raises ValidationError for unsupported formats and for
+    images with more than RECIPE_IMAGE_MAX_PIXELS pixels, and lets
+    UnidentifiedImageError through when no header could be parsed.
+    """
+    max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+    try:
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            f"Images may have at most {max_pixels} pixels."
+        ) from None
+    if image_format not in IMAGE_FORMATS:
+        raise ValidationError(
+            f"Unsupported image format {image_format}; "
+            "upload JPEG, PNG, WebP or GIF."
+        )
+    if width * height > max_pixels:
+        raise ValidationError(
+            f"Images may have at most {max_pixels} pixels, "
+            f"got {width}x{height}."
+        )
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploads to disk, rejecting oversized images while they arrive.
+
+    Requests whose Content-Length can not fit the byte cap are refused
+    before any body is read. Each file is counted as it is written, and
+    its header is checked once enough of it is on disk, so a too large
+    image fails after its first chunks rather than after the whole body.
+    """
+
+    def handle_raw_input(
+        self,
+        input_data,
+        META,
+        content_length,
+        boundary,
+        encoding=None,
+    ):
+        limit = settings.RECIPE_IMAGE_MAX_BYTES + MULTIPART_OVERHEAD
+        if content_length > limit:
+            raise ImageTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header_checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_BYTES:
+            self.upload_interrupted()
+            raise ImageTooLarge()
+        super().receive_data_chunk(raw_data, start)
+        if not self.header_checked and start < HEADER_BYTES:
+            self._check_header()
+
+    def _check_header(self):
+        self.file.flush()
+        try:
+            check_image_header(self.file.temporary_file_path())
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            # header incomplete so far, or not an image: the serializer
+            # decides once the whole file is in
+            return
+        except ValidationError as exc:
+            self.upload_interrupted()
+            raise ValidationError({self.field_name: exc.detail})
+        self.header_checked = True
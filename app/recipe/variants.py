@@ -0,0 +1,151 @@
+"""
+Recipe image URLs and background generation of resized variants
+"""
+
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from core.models import ImageBlob, Recipe
+from .blobs import VARIANT_DIR, store_image
+from .cache import bump_user_version
+from .thumbnails import render_variants
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def image_url(name, request=None):
+    """URL of a stored image name as ImageField renders it"""
+    if not name:
+        return None
+    url = Recipe._meta.get_field("image").storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def variant_urls(variants, request=None):
+    """Turn stored {"<size>": {"<format>": name}} into URLs"""
+    return {
+        size: {key: image_url(name, request) for key, name in files.items()}
+        for size, files in (variants or {}).items()
+    }
+
+
+def save_recipe(serializer, **kwargs):
+    """Save a recipe serializer, scheduling variants for a new image.
+
+    The variants of the previous image are dropped in the same save, so
+    clients never get thumbnails of an image that was replaced.
+    """
+    new_image = "image" in serializer.validated_data
+    if new_image:
+        kwargs["image_variants"] = {}
+        if serializer.validated_data["image"]:
+            kwargs["image"] = store_image(serializer.validated_data["image"])
+    recipe = serializer.save(**kwargs)
+    if new_image and recipe.image:
+        schedule_variants(recipe)
+    return recipe
+
+
+def schedule_variants(recipe):
+    """Render variants of `recipe`'s current image once the write commits"""
+    job = (recipe.pk, recipe.user_id, recipe.image.name)
+    transaction.on_commit(lambda: submit_variants(*job))
+
+
+def submit_variants(recipe_id, user_id, name):
+    """Render in the worker pool, or inline without workers configured.
+
+    An image whose blob already has variants (the same content uploaded
+    before) reuses them without rendering.
+    """
+    rendered = (
+        ImageBlob.objects.filter(name=name)
+        .exclude(variants={})
+        .values_list("variants", flat=True)
+        .first()
+    )
+    if rendered:
+        return _record_variants(recipe_id, user_id, name, rendered)
+    args = render_args(name)
+    if not settings.RECIPE_THUMBNAIL_WORKERS:
+        files = render_variants(*args)
+        return store_variants(recipe_id, user_id, name, files)
+
+    caller = threading.get_ident()
+
+    def done(future):
+        try:
+            store_variants(recipe_id, user_id, name, future.result())
+        except Exception:
+            logger.exception("Image variants of recipe %s failed", recipe_id)
+        finally:
+            if threading.get_ident() != caller:
+                # the pool's result thread opened this connection
+                connection.close()
+
+    try:
+        future = get_executor().submit(render_variants, *args)
+    except BrokenProcessPool:
+        # a worker died (e.g. killed on memory); start a fresh pool
+        future = get_executor(replace=True).submit(render_variants, *args)
+    future.add_done_callback(done)
+
+
+def get_executor(replace=False):
+    """The process-wide pool rendering variants off the request path"""
+    global _executor
+    with _executor_lock:
+        if replace and _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RECIPE_THUMBNAIL_WORKERS
+            )
+        return _executor
+
+
+def render_args(name):
+    """render_variants arguments for image `name` on the image storage"""
+    storage = Recipe._meta.get_field("image").storage
+    target = storage.path(variant_dir(name))
+    os.makedirs(target, exist_ok=True)
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    return storage.path(name), target, stem
+
+
+def variant_dir(name):
+    return posixpath.join(posixpath.dirname(name), VARIANT_DIR)
+
+
+def store_variants(recipe_id, user_id, name, files):
+    """Record rendered `files` unless the recipe's image changed meanwhile"""
+    directory = variant_dir(name)
+    variants = {
+        size: {
+            key: posixpath.join(directory, file_name)
+            for key, file_name in formats.items()
+        }
+        for size, formats in files.items()
+    }
+    ImageBlob.objects.filter(name=name).update(variants=variants)
+    return _record_variants(recipe_id, user_id, name, variants)
+
+
+def _record_variants(recipe_id, user_id, name, variants):
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants=variants,
+        modified_at=timezone.now(),
+    )
+    if updated:
+        bump_user_version(user_id)
+    return variants
@@ -1,14 +1,62 @@
+import mimetypes
+import os
+import posixpath
+from urllib.parse import quote
 from . import serializers
-from core.models import Recipe, Tag, Ingredient
-from rest_framework import viewsets, mixins
-from rest_framework.authentication import (
-    TokenAuthentication,
-    SessionAuthentication,
+from .blobs import BLOB_DIR, BLOB_NAME_RE, source_key
+from .cache import CachedResponseMixin, bump_user_version
+from .documents import document_data, document_list_rows, is_current
+from .facets import facet_counts
+from .export import iter_recipe_ndjson, iter_recipe_ndjson_sql
+from .lookups import TrigramWordSimilarity
+from .pagination import RecipeCursorPagination
+from .readers import (
+    nested_prefetches,
+    recipe_list_rows,
+    recipe_list_values,
+)
+from .renderers import FastJSONRenderer, NDJSONRenderer
+from .sqljson import page_json
+from .uploads import BoundedImageUploadHandler
+from .variants import save_recipe
+from core.models import Recipe, RecipeDocument, Tag, Ingredient
+from user.authentication import CachedTokenAuthentication
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models.functions import Cast, Coalesce
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    prefetch_related_objects,
 )
+from rest_framework import viewsets, mixins
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.views import APIView
 from drf_spectacular.utils import (
     extend_schema,
     OpenApiParameter,
@@ -17,60 +65,200 @@ from drf_spectacular.utils import (
 )
 
 
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        "tags",
+        OpenApiTypes.STR,
+        description="Comma seperated list of tag ids",
+    ),
+    OpenApiParameter(
+        "ingredients",
+        OpenApiTypes.STR,
+        description="Comma seperated list of ingredient ids",
+    ),
+    OpenApiParameter(
+        "search",
+        OpenApiTypes.STR,
+        description="Full text search over title and description",
+    ),
+    OpenApiParameter(
+        "match",
+        OpenApiTypes.STR,
+        description="Match recipes having any or all of the given ids",
+        enum=["any", "all"],
+    ),
+]
+
+SPARSE_FIELD_PARAMETERS = [
+    OpenApiParameter(
+        "fields",
+        OpenApiTypes.STR,
+        description="Comma seperated list of fields to return",
+    ),
+    OpenApiParameter(
+        "exclude",
+        OpenApiTypes.STR,
+        description="Comma seperated list of fields to leave out",
+    ),
+]
+
+
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
-            OpenApiParameter(
-                "tags",
-                OpenApiTypes.STR,
-                description="Comma seperated list of tag ids",
-            ),
+        parameters=RECIPE_FILTER_PARAMETERS
+        + SPARSE_FIELD_PARAMETERS
+        + [
             OpenApiParameter(
-                "ingredients",
+                "render",
                 OpenApiTypes.STR,
-                description="Comma seperated list of ingredient ids",
+                description="Build the JSON inside PostgreSQL",
+                enum=["sql"],
             ),
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELD_PARAMETERS),
 )
-class RecipeViewset(viewsets.ModelViewSet):
+class RecipeViewset(CachedResponseMixin, viewsets.ModelViewSet):
     """View for managing recipes"""
 
     serializer_class = serializers.RecipeDetailSerializer
     authentication_classes = [
-        TokenAuthentication,
+        CachedTokenAuthentication,
         SessionAuthentication,
     ]
     permission_classes = [
         IsAuthenticated,
     ]
+    pagination_class = RecipeCursorPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     queryset = Recipe.objects.all()
+    max_filter_ids = 100
+    image_actions = ("create", "update", "partial_update", "upload_image")
+
+    def initialize_request(self, request, *args, **kwargs):
+        """Stream image uploads to disk under the image byte cap"""
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action in self.image_actions:
+            request.upload_handlers = [BoundedImageUploadHandler(request)]
+        return drf_request
 
-    def _params_to_ints(self, qs=""):
+    def _params_to_ints(self, qs="", param="ids"):
         """returns list of ints from query parameter string"""
-        return [int(str_id) for str_id in qs.split(",")]
+        try:
+            ids = {int(str_id) for str_id in qs.split(",")}
+        except ValueError:
+            raise ValidationError(
+                {param: ["Expected a comma seperated list of integer ids."]}
+            )
+        if len(ids) > self.max_filter_ids:
+            raise ValidationError(
+                {param: [f"At most {self.max_filter_ids} ids are allowed."]}
+            )
+        return sorted(ids)
+
+    def _filter_by_related(self, queryset, field, ids, match_all):
+        """Filter recipes linked to `ids` through the `field` M2M table.
+
+        Uses a correlated EXISTS (any) or COUNT (all) subquery on the
+        through table instead of a JOIN, so no DISTINCT is needed.
+        """
+        m2m = Recipe._meta.get_field(field)
+        links = m2m.remote_field.through.objects.filter(
+            **{
+                m2m.m2m_field_name(): OuterRef("pk"),
+                f"{m2m.m2m_reverse_field_name()}__in": ids,
+            }
+        )
+        if not match_all:
+            return queryset.filter(Exists(links))
+        matched = (
+            links.order_by()
+            .values(m2m.m2m_field_name())
+            .annotate(total=Count("*"))
+            .values("total")
+        )
+        alias = f"{field}_matched"
+        return queryset.alias(**{alias: Subquery(matched)}).filter(
+            **{alias: len(ids)}
+        )
 
     def get_queryset(self):
         """Retrieve recipes for the authenticated user"""
-        tags = self.request.query_params.get("tags")
-        ingredients = self.request.query_params.get("ingredients")
-        queryset = self.queryset
-        if tags:
-            """Filter queryset based on tag ids"""
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            """Filter queryset based on ingredient ids"""
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        params = self.request.query_params
+        match = params.get("match", "any").lower()
+        if match not in ("any", "all"):
+            raise ValidationError({"match": ["Expected 'any' or 'all'."]})
+        queryset = self.queryset.filter(user=self.request.user)
+        for field in ("tags", "ingredients"):
+            if params.get(field):
+                ids = self._params_to_ints(params[field], param=field)
+                queryset = self._filter_by_related(
+                    queryset,
+                    field,
+                    ids,
+                    match_all=match == "all",
+                )
 
-        return (
-            queryset.filter(
-                user=self.request.user,
+        search = params.get("search", "").strip()
+        if search:
+            query = SearchQuery(search, config="english", search_type="websearch")
+            # ts_rank is a real; as double precision the cursor's
+            # str(float) position compares equal to the ranks it came from
+            queryset = queryset.filter(search_vector=query).annotate(
+                search_rank=Cast(
+                    SearchRank(F("search_vector"), query),
+                    FloatField(),
+                )
             )
-            .order_by("-id")
-            .distinct()
-        )
+
+        queryset = queryset.defer("search_vector").order_by("-id")
+        if self.action == "retrieve":
+            queryset = queryset.prefetch_related(
+                *nested_prefetches(self._sparse_fields())
+            )
+        return queryset
+
+    def _sparse_fields(self):
+        """Serializer fields kept by ?fields= and ?exclude=.
+
+        Returns None when every field is wanted, so callers can keep their
+        full-payload fast paths. Fields keep the serializer's order.
+        """
+        params = self.request.query_params
+        available = self.get_serializer_class().Meta.fields
+        requested = {}
+        for param in ("fields", "exclude"):
+            names = [
+                name.strip()
+                for name in params.get(param, "").split(",")
+                if name.strip()
+            ]
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                raise ValidationError(
+                    {param: [f"Unknown fields: {', '.join(unknown)}."]}
+                )
+            requested[param] = names
+        fields = [
+            name
+            for name in available
+            if (not requested["fields"] or name in requested["fields"])
+            and name not in requested["exclude"]
+        ]
+        if not fields:
+            raise ValidationError({"fields": ["No fields left to return."]})
+        if len(fields) == len(available):
+            return None
+        return fields
+
+    def get_serializer_context(self):
+        """Prune read serializers to the requested sparse fieldset"""
+        context = super().get_serializer_context()
+        if self.action in ("list", "retrieve"):
+            fields = self._sparse_fields()
+            if fields is not None:
+                context["fields"] = fields
+        return context
 
     def get_serializer_class(self):
         """Return the serializer for http methods"""
@@ -78,19 +266,349 @@ class RecipeViewset(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         if self.action == "upload_image":
             return serializers.RecipeImageSerializer
+        if self.action == "batch":
+            return serializers.RecipeBatchOperationSerializer
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        if self._render_in_db():
+            return self._cached(self._list_sql, request, *args, **kwargs)
+        return self._cached(self._list_documents, request, *args, **kwargs)
+
+    def _render_in_db(self):
+        """True if the client asked for ?render=sql"""
+        render = self.request.query_params.get("render")
+        if render not in (None, "sql"):
+            raise ValidationError({"render": ["Expected 'sql'."]})
+        return render == "sql"
+
+    def _list_sql(self, request, *args, **kwargs):
+        """List with each recipe's JSON assembled by PostgreSQL.
+
+        Only the page's ids (and cursor columns) reach Python; the
+        recipes themselves arrive as JSON text and are streamed as is.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(
+            queryset.values("id", *queryset.query.annotation_select)
+        )
+        texts = page_json(
+            self._sparse_fields() or serializers.RecipeSerializer.Meta.fields,
+            [row["id"] for row in page],
+        )
+        links = FastJSONRenderer().render(
+            {
+                "next": self.paginator.get_next_link(),
+                "previous": self.paginator.get_previous_link(),
+            }
+        )
+
+        def body():
+            yield links[:-1] + b',"results":['
+            for index, text in enumerate(texts):
+                yield (b"," if index else b"") + text.encode()
+            yield b"]}"
+
+        return StreamingHttpResponse(body(), content_type="application/json")
+
+    def _list_documents(self, request, *args, **kwargs):
+        """List from the stored RecipeDocuments.
+
+        The page comes from one statement joining each recipe to its
+        document, so no serializer runs and no relation is prefetched.
+        """
+        fields = self._sparse_fields()
+        if fields is not None:
+            return self._list_rows(request, fields)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(
+            queryset.values(
+                "id",
+                "document__data",
+                *queryset.query.annotation_select,
+            )
+        )
+        return self.get_paginated_response(
+            document_list_rows(
+                page,
+                serializers.RecipeSerializer.Meta.fields,
+                request,
+            )
+        )
+
+    def _list_rows(self, request, fields):
+        """List only `fields`, selecting just their columns and relations"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(recipe_list_values(queryset, fields))
+        return self.get_paginated_response(
+            recipe_list_rows(page, fields, request)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(self._retrieve_document, request, *args, **kwargs)
+
+    def _retrieve_document(self, request, *args, **kwargs):
+        """Return the stored RecipeDocument with a single-table lookup"""
+        fields = self._sparse_fields()
+        if fields is not None:
+            return self._retrieve_row(request, fields, kwargs["pk"])
+        try:
+            data = (
+                RecipeDocument.objects.filter(
+                    user=request.user,
+                    recipe_id=kwargs["pk"],
+                )
+                .values_list("data", flat=True)
+                .first()
+            )
+        except (TypeError, ValueError):
+            data = None
+        fields = serializers.RecipeDetailSerializer.Meta.fields
+        if not is_current(data, fields):
+            # not found, or a document not (re)rendered yet
+            return super().retrieve(request, *args, **kwargs)
+        return Response(document_data(data, fields, request))
+
+    def _retrieve_row(self, request, fields, pk):
+        """Return only `fields` of one recipe from a values() row"""
+        try:
+            rows = list(
+                recipe_list_values(
+                    self.queryset.filter(user=request.user, pk=pk),
+                    fields,
+                )
+            )
+        except (TypeError, ValueError):
+            rows = []
+        if not rows:
+            raise Http404
+        return Response(recipe_list_rows(rows, fields, request)[0])
+
+    def get_validators(self, request, key):
+        """Validate a detail by the recipe's own modified_at.
+
+        A single indexed lookup, so unchanged recipes are answered with a
+        304 even after other recipes of the user changed.
+        """
+        if self.action != "retrieve":
+            return super().get_validators(request, key)
+        try:
+            modified_at = (
+                self.queryset.filter(user=request.user, pk=self.kwargs["pk"])
+                .values_list("modified_at", flat=True)
+                .first()
+            )
+        except (TypeError, ValueError):
+            modified_at = None
+        if modified_at is None:
+            # let retrieve() produce the 404
+            return None, None
+        etag = f'W/"{self.kwargs["pk"]}-{modified_at.timestamp():.6f}"'
+        return etag, int(modified_at.timestamp())
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
-        return super().perform_create(serializer)
+        save_recipe(serializer, user=self.request.user)
+
+    def perform_update(self, serializer):
+        save_recipe(serializer)
+
+    @extend_schema(
+        request=serializers.RecipeBatchOperationSerializer(many=True),
+        responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    )
+    @action(methods=["POST"], detail=False, url_path="batch")
+    def batch(self, request):
+        """Apply many create/update/delete operations in one transaction.
+
+        Every operation is validated first; if any fails nothing is written
+        and the response lists the errors per operation. Otherwise deletes
+        run as one DELETE, creates as one bulk insert and updates through
+        RecipeDetailSerializer, all inside a single transaction.
+        """
+        # refused before any operation is validated
+        if (
+            isinstance(request.data, list)
+            and len(request.data) > settings.RECIPE_BATCH_MAX_OPERATIONS
+        ):
+            msg = (
+                "At most "
+                f"{settings.RECIPE_BATCH_MAX_OPERATIONS} operations are allowed."
+            )
+            return Response(
+                {"errors": [msg]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        operations = self.get_serializer(data=request.data, many=True)
+        if not operations.is_valid():
+            return Response(
+                {"errors": operations.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        operations = operations.validated_data
+
+        context = self.get_serializer_context()
+        recipes = self.queryset.filter(user=request.user).in_bulk(
+            [op["id"] for op in operations if "id" in op]
+        )
+        errors = [{} for _ in operations]
+        creates, updates, deletes = [], [], []
+        seen = set()
+        for index, op in enumerate(operations):
+            if op["op"] == "create":
+                creates.append(index)
+                continue
+            recipe = recipes.get(op["id"])
+            if recipe is None:
+                errors[index] = {"id": ["Not found."]}
+                continue
+            if recipe.id in seen:
+                errors[index] = {"id": ["Recipe used by another operation."]}
+                continue
+            seen.add(recipe.id)
+            if op["op"] == "delete":
+                deletes.append(index)
+                continue
+            serializer = serializers.RecipeDetailSerializer(
+                recipe,
+                data=op["data"],
+                partial=True,
+                context=context,
+            )
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+            updates.append((index, serializer))
+
+        create_serializer = serializers.RecipeDetailSerializer(
+            data=[operations[index]["data"] for index in creates],
+            many=True,
+            context=context,
+        )
+        if not create_serializer.is_valid():
+            for index, error in zip(creates, create_serializer.errors):
+                if error:
+                    errors[index] = error
+        if any(errors):
+            return Response(
+                {"errors": errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = [None] * len(operations)
+        with transaction.atomic():
+            if deletes:
+                Recipe.objects.filter(
+                    id__in=[operations[index]["id"] for index in deletes]
+                ).delete()
+            for index, serializer in updates:
+                save_recipe(serializer)
+                results[index] = {
+                    "op": "update",
+                    "status": status.HTTP_200_OK,
+                    "data": serializer.data,
+                }
+            created = []
+            if creates:
+                created = create_serializer.save(user=request.user)
+                # bulk inserts send no post_save
+                bump_user_version(request.user.pk)
+
+        prefetch_related_objects(created, "tags", "ingredients")
+        created_data = serializers.RecipeDetailSerializer(
+            created,
+            many=True,
+            context=context,
+        ).data
+        for index, data in zip(creates, created_data):
+            results[index] = {
+                "op": "create",
+                "status": status.HTTP_201_CREATED,
+                "data": data,
+            }
+        for index in deletes:
+            results[index] = {
+                "op": "delete",
+                "status": status.HTTP_204_NO_CONTENT,
+                "id": operations[index]["id"],
+            }
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "after",
+                OpenApiTypes.INT,
+                description="Resume the export after this recipe id",
+            ),
+            OpenApiParameter(
+                "render",
+                OpenApiTypes.STR,
+                description="Build the JSON inside PostgreSQL",
+                enum=["sql"],
+            ),
+        ],
+        responses={(200, "application/x-ndjson"): OpenApiTypes.STR},
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="export",
+        renderer_classes=[FastJSONRenderer, NDJSONRenderer],
+    )
+    def export(self, request):
+        """Stream all of the user's recipes as NDJSON, oldest first"""
+        after = request.query_params.get("after")
+        if after is not None:
+            try:
+                after = int(after)
+            except ValueError:
+                raise ValidationError({"after": ["Expected an integer id."]})
+        if self._render_in_db():
+            lines = iter_recipe_ndjson_sql(
+                request.user,
+                after=after,
+                chunk_size=settings.RECIPE_EXPORT_CHUNK_SIZE,
+                media_url=request.build_absolute_uri(settings.MEDIA_URL),
+            )
+        else:
+            lines = iter_recipe_ndjson(
+                request.user,
+                after=after,
+                chunk_size=settings.RECIPE_EXPORT_CHUNK_SIZE,
+                context=self.get_serializer_context(),
+            )
+        return StreamingHttpResponse(
+            lines,
+            content_type="application/x-ndjson",
+        )
+
+    @extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(methods=["GET"], detail=False, url_path="facets")
+    def facets(self, request):
+        """Count recipes per tag and ingredient for the current filters.
+
+        Takes the same filters as the list; all counts come from one
+        aggregate query and are served from the response cache until the
+        user's next write.
+        """
+        return self._cached(self._facets, request)
+
+    def _facets(self, request):
+        return Response(facet_counts(self.filter_queryset(self.get_queryset())))
 
     @action(methods=["POST"], detail=True, url_path="upload-image")
     def upload_image(self, request, pk=None):
-        """Upload an image to the recipe"""
+        """Upload an image to the recipe.
+
+        Resized variants are rendered in the background and show up in
+        image_variants once ready.
+        """
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            save_recipe(serializer)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -105,37 +623,207 @@ class RecipeViewset(viewsets.ModelViewSet):
                 description="Filter items assigned to recipes , True/False",
                 enum=["True", "False"],
             ),
+            OpenApiParameter(
+                "with_counts",
+                OpenApiTypes.STR,
+                description="Include the number of recipes using each item",
+                enum=["True", "False"],
+            ),
+            OpenApiParameter(
+                "q",
+                OpenApiTypes.STR,
+                description="Autocomplete: best matching names for this text",
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description="Maximum number of autocomplete matches",
+            ),
         ]
     )
 )
 class BaseRecipeAttrViewset(
+    CachedResponseMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
 ):
     authentication_classes = [
-        TokenAuthentication,
+        CachedTokenAuthentication,
         SessionAuthentication,
     ]
     permission_classes = [
         IsAuthenticated,
     ]
 
+    def _flag(self, name):
+        value = self.request.query_params.get(name)
+        return bool(value) and value.lower() == "true"
+
+    def _links(self):
+        """Through table rows pointing at the outer tag/ingredient"""
+        m2m = Recipe._meta.get_field(self.recipe_field)
+        column = m2m.m2m_reverse_field_name()
+        links = m2m.remote_field.through.objects.filter(
+            **{column: OuterRef("pk")}
+        )
+        return links, column
+
     def get_queryset(self):
         """Retrieve queryset based on the authenticated user"""
         queryset = self.queryset.filter(user=self.request.user)
-        assigned_only = self.request.query_params.get("assigned_only")
-        if assigned_only and assigned_only.lower() == "true":
-            queryset = queryset.filter(recipe__isnull=False).distinct()
+        links, column = self._links()
+        if self._flag("assigned_only"):
+            # EXISTS on the through table instead of JOIN + DISTINCT
+            queryset = queryset.filter(Exists(links))
+        if self._flag("with_counts"):
+            counts = (
+                links.order_by()
+                .values(column)
+                .annotate(total=Count("*"))
+                .values("total")
+            )
+            queryset = queryset.annotate(
+                recipe_count=Coalesce(Subquery(counts), 0)
+            )
+        q = self.request.query_params.get("q", "").strip()
+        if q and self.action == "list":
+            return self._autocomplete(queryset, q)
         return queryset.order_by("-name")
 
+    def _autocomplete(self, queryset, q):
+        """Top matches for `q` by prefix or trigram word similarity"""
+        try:
+            limit = int(
+                self.request.query_params.get(
+                    "limit", settings.AUTOCOMPLETE_LIMIT
+                )
+            )
+        except ValueError:
+            raise ValidationError({"limit": ["Expected an integer."]})
+        limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_LIMIT))
+        if len(q) == 1:
+            # too short to form a trigram, fall back to a plain prefix match
+            matches = Q(name__istartswith=q)
+        else:
+            # `%>` is answered from the gin_trgm_ops index on name
+            matches = Q(name__trigram_word_similar=q)
+        return (
+            queryset.filter(matches)
+            .annotate(
+                word_similarity=TrigramWordSimilarity(q, "name"),
+                similarity=TrigramSimilarity("name", q),
+            )
+            .order_by("-word_similarity", "-similarity", "name")[:limit]
+        )
+
+    def get_serializer_class(self):
+        if self._flag("with_counts"):
+            return self.count_serializer_class
+        return self.serializer_class
+
+    def perform_update(self, serializer):
+        """Reject renames that collide with another of the user's names"""
+        name = serializer.validated_data.get("name")
+        duplicate = (
+            self.queryset.filter(user=self.request.user, name=name)
+            .exclude(pk=serializer.instance.pk)
+            .exists()
+        )
+        if name and duplicate:
+            raise ValidationError({"name": ["This name already exists."]})
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # a concurrent rename took the name after the check above
+            raise ValidationError({"name": ["This name already exists."]})
+
 
 class TagViewSet(BaseRecipeAttrViewset):
     serializer_class = serializers.TagSerializer
+    count_serializer_class = serializers.TagCountSerializer
     queryset = Tag.objects.all()
+    recipe_field = "tags"
 
 
 class IngredientViewSet(BaseRecipeAttrViewset):
     serializer_class = serializers.IngredientSerializer
+    count_serializer_class = serializers.IngredientCountSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = "ingredients"
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Skip Accept matching; image requests accept no API media type"""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+@extend_schema(exclude=True)
+class RecipeMediaView(APIView):
+    """Serve a recipe image or variant to a user owning a recipe using it.
+
+    Django only checks ownership and conditional headers; the bytes are
+    sent by nginx from an internal location named in X-Accel-Redirect
+    (or by FileResponse when MEDIA_ACCEL_REDIRECT is off, e.g. DEBUG).
+    The ETag follows nginx's own "mtime-size" format, so a revalidation
+    answered by either side agrees.
+    """
+
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SessionAuthentication,
+    ]
+    permission_classes = [
+        IsAuthenticated,
+    ]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request, name):
+        key = source_key(name)
+        if (
+            key is None
+            or posixpath.normpath(name) != name
+            or not name.startswith(f"{BLOB_DIR}/")
+            or not Recipe.objects.filter(
+                user=request.user,
+                image__startswith=key,
+            ).exists()
+        ):
+            raise Http404
+        storage = Recipe._meta.get_field("image").storage
+        try:
+            stat = os.stat(storage.path(name))
+        except FileNotFoundError:
+            raise Http404
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(stat.st_mtime),
+        )
+        if response is None:
+            if settings.MEDIA_ACCEL_REDIRECT:
+                response = HttpResponse(
+                    content_type=mimetypes.guess_type(name)[0]
+                )
+                response["X-Accel-Redirect"] = (
+                    settings.MEDIA_ACCEL_REDIRECT_URL + quote(name)
+                )
+            else:
+                response = FileResponse(storage.open(name))
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        # content addressed names never change; access stays per user
+        response["Cache-Control"] = (
+            "private, max-age=31536000, immutable"
+            if BLOB_NAME_RE.match(name)
+            else "private, max-age=86400"
+        )
+        return response
@@ -0,0 +1,88 @@
+"""
+Token authentication backed by the shared cache
+"""
+
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def get_cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    """Cache key of a token, keeping the raw token out of cache storage"""
+    return f"auth:token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def evict_tokens(keys):
+    """Drop cached lookups of token `keys`.
+
+    Evicts now and again once the surrounding transaction commits, so a
+    request racing the write can not cache the user as it was before.
+    """
+    cache_keys = [token_cache_key(key) for key in keys]
+    if not cache_keys:
+        return
+
+    def evict():
+        get_cache().delete_many(cache_keys)
+
+    evict()
+    transaction.on_commit(evict)
+
+
+def evict_user_tokens(user_id):
+    """Drop cached lookups of every token of `user_id`"""
+    keys = Token.objects.filter(user_id=user_id).values_list("key", flat=True)
+    evict_tokens(list(keys))
+
+
+def _instance(model, values):
+    """`model` instance with `values` loaded and its other fields deferred"""
+    names = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(
+        router.db_for_read(model),
+        names,
+        [values[name] for name in names],
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication resolving token -> user from the cache.
+
+    A hit costs no query. Only successful lookups are stored, for
+    AUTH_TOKEN_CACHE_TIMEOUT seconds; user.signals evicts an entry when
+    its token is deleted, its user is saved (deactivation, password
+    change) or logs out. QuerySet.update() sends no signals, so writes
+    made that way are picked up when the entry expires.
+
+    The cache holds the user's fields except the password, never the
+    token: the user is rebuilt with password deferred, so it loads on
+    access and a save() leaves it alone unless it was set.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        values = get_cache().get(cache_key)
+        if values is None:
+            user, _ = super().authenticate_credentials(key)
+            values = {
+                field.attname: getattr(user, field.attname)
+                for field in user._meta.concrete_fields
+                if field.name != "password"
+            }
+            get_cache().set(cache_key, values, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        user = _instance(get_user_model(), values)
+        token = _instance(Token, {"key": key, "user_id": user.pk})
+        token.user = user
+        return user, token
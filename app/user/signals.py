@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import evict_tokens, evict_user_tokens
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def evict_tokens_of_saved_user(sender, instance, created, **kwargs):
+    if not created:
+        evict_user_tokens(instance.pk)
+
+
+@receiver(user_logged_out)
+def evict_tokens_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        evict_user_tokens(user.pk)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    evict_tokens([instance.key])
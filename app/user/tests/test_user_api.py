@@ -1,12 +1,20 @@
+from unittest.mock import patch
+from django.conf import settings
 from django.test import TestCase
+from django.test.client import ClientHandler
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from app.handlers import LeanAPIHandlerMixin
+from user.authentication import get_cache, token_cache_key
 
 user_create_url = reverse("user:create")
 create_token_url = reverse("user:token")
 me_url = reverse("user:me")
+logout_url = reverse("user:logout")
+login_url = reverse("user:login")
 
 
 def create_user(**params):
@@ -169,3 +177,197 @@ class PrivateUserAPITests(TestCase):
         self.assertEqual(self.user.first_name, user_details["first_name"])
         self.assertEqual(self.user.last_name, user_details["last_name"])
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token lookups are cached and evicted on account changes"""
+
+    def setUp(self):
+        self.user = create_user(
+            first_name="first",
+            last_name="last",
+            username="testuser",
+            email="admin@admin.com",
+            password="testpass",
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def tearDown(self):
+        get_cache().delete(token_cache_key(self.token.key))
+
+    def _cached(self):
+        return get_cache().get(token_cache_key(self.token.key)) is not None
+
+    def test_repeated_request_skips_token_query(self):
+        """Test only the first request looks the token up"""
+        with self.assertNumQueries(1):
+            res = self.client.get(me_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(me_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+
+    def test_cache_holds_no_secrets(self):
+        """Test neither the token nor the password hash is cached"""
+        self.client.get(me_url)
+
+        cached = get_cache().get(token_cache_key(self.token.key))
+
+        self.assertEqual(cached["email"], self.user.email)
+        self.assertNotIn("password", cached)
+        self.assertNotIn(self.token.key, repr(cached))
+        self.assertNotIn(self.user.password, repr(cached))
+
+    def test_update_from_cache_keeps_password(self):
+        """Test saving a user rebuilt from the cache keeps its password"""
+        self.client.get(me_url)
+
+        res = self.client.patch(me_url, {"first_name": "updated"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "updated")
+        self.assertTrue(self.user.check_password("testpass"))
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user evicts its cached token"""
+        self.client.get(me_url)
+
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(me_url)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_evicts(self):
+        """Test changing the password drops the cached lookup"""
+        self.client.get(me_url)
+        self.assertTrue(self._cached())
+
+        res = self.client.patch(me_url, {"password": "newpassword"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(self._cached())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("newpassword"))
+
+    def test_deleted_token_rejected(self):
+        """Test deleting the token evicts it"""
+        self.client.get(me_url)
+
+        Token.objects.filter(user=self.user).delete()
+
+        res = self.client.get(me_url)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_evicts(self):
+        """Test logging out drops the cached lookup"""
+        self.client.get(me_url)
+
+        res = self.client.get(logout_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(self._cached())
+
+
+class LeanAPIClientHandler(LeanAPIHandlerMixin, ClientHandler):
+    pass
+
+
+class LeanAPIMiddlewareTests(TestCase):
+    """Test token API calls skip the session based middleware"""
+
+    def setUp(self):
+        self.user = create_user(
+            first_name="first",
+            last_name="last",
+            username="testuser",
+            email="admin@admin.com",
+            password="testpass",
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.handler = LeanAPIClientHandler()
+
+    def tearDown(self):
+        get_cache().delete(token_cache_key(self.token.key))
+
+    def _token_client(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        return self.client
+
+    def test_lean_chain_built_without_touching_settings(self):
+        """Test loading the lean chain never reassigns settings"""
+        handler = LeanAPIClientHandler()
+        with patch.object(type(settings), "__setattr__") as set_setting:
+            handler.load_middleware()
+
+        set_setting.assert_not_called()
+        self.assertEqual(handler.api_handler._view_middleware, [])
+        self.assertTrue(handler._view_middleware)
+
+    def test_api_middleware_follows_middleware(self):
+        """Test the lean chain is MIDDLEWARE minus the session based ones"""
+        kept = [
+            path
+            for path in settings.MIDDLEWARE
+            if path not in settings.API_SKIPPED_MIDDLEWARE
+        ]
+
+        self.assertEqual(settings.API_MIDDLEWARE, kept)
+        self.assertIn(
+            "django.middleware.common.CommonMiddleware",
+            settings.API_MIDDLEWARE,
+        )
+        self.assertNotIn(
+            "django.contrib.sessions.middleware.SessionMiddleware",
+            settings.API_MIDDLEWARE,
+        )
+
+    def test_token_call_uses_lean_chain(self):
+        """Test a token call is served without session or CSRF handling"""
+        res = self._token_client().get(me_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+        self.assertFalse(hasattr(res.wsgi_request, "session"))
+        self.assertNotIn("X-Frame-Options", res)
+
+    def test_session_cookie_keeps_full_chain(self):
+        """Test browser calls carrying a session keep every middleware"""
+        self.client.login(username=self.user.email, password="testpass")
+
+        res = self._token_client().get(me_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(res.wsgi_request, "session"))
+        self.assertIn("X-Frame-Options", res)
+
+    def test_html_views_keep_full_chain(self):
+        """Test the login page renders even with a token header"""
+        res = self._token_client().get(login_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(res.wsgi_request, "session"))
+
+    def test_logout_without_session(self):
+        """Test logging out a token call evicts its cached lookup"""
+        self._token_client().get(me_url)
+
+        res = self.client.get(logout_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(hasattr(res.wsgi_request, "session"))
+        self.assertIsNone(get_cache().get(token_cache_key(self.token.key)))
+
+    def test_unauthenticated_rejected(self):
+        """Test a bad token on the lean chain is still refused"""
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+
+        res = self.client.get(me_url)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
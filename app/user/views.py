@@ -4,9 +4,11 @@ from rest_framework.settings import api_settings
 from django.shortcuts import render, redirect
 from .forms import RegisterForm
 from django.contrib.auth import get_user_model
+from .authentication import CachedTokenAuthentication
 from .serializers import TokenSerializer, UserSerializer
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth.signals import user_logged_out
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -30,7 +32,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
 
     serializer_class = UserSerializer
     authentication_classes = [
-        authentication.TokenAuthentication,
+        CachedTokenAuthentication,
         authentication.SessionAuthentication,
     ]
     permission_classes = [
@@ -93,7 +95,15 @@ def login_view(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def logout_view(request):
-    logout(request)
+    if hasattr(request, "session"):
+        logout(request)
+    else:
+        # token call on the lean middleware chain: no session to end
+        user_logged_out.send(
+            sender=request.user.__class__,
+            request=request,
+            user=request.user,
+        )
     return Response(
         {"detail": "Successfully logged out."},
         status=status.HTTP_200_OK,
@@ -4,6 +4,16 @@ server{
     location /static{
         alias /vol/static;
     }
+    # media lives in the same volume but must pass the app's ownership check
+    location /static/media {
+        return 404;
+    }
+    # files the app hands over with X-Accel-Redirect; its Cache-Control is
+    # kept, ETag and Last-Modified come from the file as for static files
+    location /protected-media/ {
+        internal;
+        alias /vol/static/media/;
+    }
     location /{
         uwsgi_pass      ${APP_HOST}:${APP_PORT};
         include         /etc/nginx/uwsgi_params;